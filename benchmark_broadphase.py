@@ -0,0 +1,183 @@
+"""Headless benchmark of every broadphase over scenes of different sizes and body distributions
+
+Run with `python benchmark_broadphase.py`, results are written to a JSON file so runs can be compared between commits.
+"""
+import argparse
+import json
+import platform
+import random
+import subprocess
+import time
+from math import sqrt
+
+from vector import Vector
+from shapes import Collidable
+from collisions import BROADPHASES
+from headless import BODY_SIZE, make_shapes
+import rigidbodies
+
+DISTRIBUTIONS = ("random", "clustered", "stacked", "streaming")
+SIZES = (100, 1000, 5000, 20000)
+DENSITY = 0.002     # bodies per square pixel, keeps the average overlap count the same at every size
+
+
+class Scene:
+    """A set of bodies moving about a square world, with its own velocities so the engine's screen bounds and
+        frame-rate dependent updates don't come into it"""
+
+    def __init__(self, distribution, count, seed=0):
+        self.random = random.Random(seed)
+        self.distribution = distribution
+        self.size = sqrt(count / DENSITY)
+        self.shapes = make_shapes(self.random)
+        self.centres = [(self.random.uniform(0.1, 0.9) * self.size, self.random.uniform(0.1, 0.9) * self.size)
+                        for _ in range(max(1, count // 200))]
+        self.bodies = []
+        self.velocities = {}
+        self.spawned = 0
+        for i in range(count):
+            self.spawn(*self.place(i, count))
+
+    def place(self, i, count):
+        """returns a position and velocity for the i-th body of the distribution"""
+        rand = self.random
+        if self.distribution == "random":
+            position = (rand.uniform(0, self.size), rand.uniform(0, self.size))
+        elif self.distribution == "clustered":
+            centre = self.centres[i % len(self.centres)]
+            position = (rand.gauss(centre[0], self.size / 40), rand.gauss(centre[1], self.size / 40))
+        elif self.distribution == "stacked":
+            # Piles of bodies resting on each other in columns, jittered so no two rects share an edge exactly
+            columns = int(sqrt(count))
+            position = ((i % columns) * BODY_SIZE * 1.5 + rand.uniform(-0.1, 0.1),
+                        (i // columns) * BODY_SIZE * 0.9 + rand.uniform(-0.1, 0.1))
+            return position, (0, rand.uniform(-0.05, 0.05))
+        else:
+            # Streaming bodies enter from the left edge and leave on the right
+            position = (rand.uniform(0, self.size), rand.uniform(0, self.size))
+            return position, (rand.uniform(2, 6), rand.uniform(-0.5, 0.5))
+        return position, (rand.uniform(-2, 2), rand.uniform(-2, 2))
+
+    def spawn(self, position, velocity):
+        kind = self.spawned % (len(self.shapes) + 1)
+        self.spawned += 1
+        if kind == len(self.shapes):
+            body = rigidbodies.Circle(None, BODY_SIZE // 2, Vector(position))
+        else:
+            body = Collidable(self.shapes[kind], 1)
+            body.position = Vector(position)
+            body.orientation = self.random.uniform(0, 6.28)
+        self.bodies.append(body)
+        self.velocities[body] = Vector(velocity)
+        return body
+
+    def step(self):
+        """moves every body, returning the bodies that left and entered the world this step"""
+        removed, added = [], []
+        for body in self.bodies:
+            velocity = self.velocities[body]
+            body.position += velocity
+            if self.distribution == "streaming":
+                if body.position.x > self.size:
+                    removed.append(body)
+                continue
+            if not 0 < body.position.x < self.size:
+                velocity.x = -velocity.x
+            if not 0 < body.position.y < self.size:
+                velocity.y = -velocity.y
+
+        for body in removed:
+            self.bodies.remove(body)
+            del self.velocities[body]
+            position = (0, self.random.uniform(0, self.size))
+            added.append(self.spawn(position, (self.random.uniform(2, 6), self.random.uniform(-0.5, 0.5))))
+        return removed, added
+
+
+def pair_set(pairs):
+    return {frozenset(pair) for pair in pairs}
+
+
+def run(distribution, count, names, frames, seed=0):
+    """times update_values and get_broad_pairs of each named broadphase over the same scene"""
+    scene = Scene(distribution, count, seed)
+    broadphases = {}
+    results = {}
+    for name in names:
+        start = time.perf_counter()
+        broadphases[name] = BROADPHASES[name](scene.bodies)
+        results[name] = {"broadphase": name, "distribution": distribution, "bodies": count, "frames": frames,
+                         "build_ms": (time.perf_counter() - start) * 1000, "update_ms": 0, "pairs_ms": 0,
+                         "pairs": 0, "matches": True}
+
+    for _ in range(frames):
+        removed, added = scene.step()
+        # Bodies cache their rects, refresh them untimed so no broadphase pays for the others' geometry
+        for body in scene.bodies:
+            body.get_bounding_rect()
+
+        reference = None
+        for name, broadphase in broadphases.items():
+            result = results[name]
+            start = time.perf_counter()
+            for body in removed:
+                broadphase.remove(body)
+            broadphase.update_values()
+            for body in added:
+                broadphase.add(body)
+            updated = time.perf_counter()
+            pairs = broadphase.get_broad_pairs()
+            result["update_ms"] += (updated - start) * 1000
+            result["pairs_ms"] += (time.perf_counter() - updated) * 1000
+            result["pairs"] += len(pairs)
+
+            pairs = pair_set(pairs)
+            if reference is None:
+                reference = pairs
+            elif pairs != reference:
+                result["matches"] = False
+
+    for result in results.values():
+        result["update_ms"] /= frames
+        result["pairs_ms"] /= frames
+        result["total_ms"] = result["update_ms"] + result["pairs_ms"]
+        result["pairs"] /= frames
+    return list(results.values())
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=SIZES)
+    parser.add_argument("--distributions", nargs="+", choices=DISTRIBUTIONS, default=DISTRIBUTIONS)
+    parser.add_argument("--broadphases", nargs="+", choices=sorted(BROADPHASES), default=sorted(BROADPHASES))
+    parser.add_argument("--frames", type=int, default=10)
+    parser.add_argument("--output", default="benchmark_results.json")
+    args = parser.parse_args()
+
+    results = []
+    for distribution in args.distributions:
+        for count in args.sizes:
+            for result in run(distribution, count, args.broadphases, args.frames):
+                results.append(result)
+                print(f"{distribution:>10} {count:>6} {result['broadphase']:>12}: "
+                      f"update {result['update_ms']:8.2f} ms, pairs {result['pairs_ms']:8.2f} ms, "
+                      f"{result['pairs']:8.1f} pairs{'' if result['matches'] else '  MISMATCH'}")
+
+    with open(args.output, "w") as file:
+        json.dump({"commit": git_commit(), "python": platform.python_version(), "time": time.time(),
+                   "results": results}, file, indent=2)
+
+    if not all(result["matches"] for result in results):
+        raise SystemExit("broadphases disagree on the pair set, see MISMATCH above")
+
+
+if __name__ == "__main__":
+    main()
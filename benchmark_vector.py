@@ -0,0 +1,72 @@
+"""Microbenchmark of the slotted Vector against the original dict-backed implementation"""
+import timeit
+import tracemalloc
+from vector import Vector
+
+
+class LegacyVector:
+    """The Vector class as it was before __slots__ and in-place operators, kept only for comparison"""
+
+    def __init__(self, values=(0, 0)):
+        if hasattr(values, '__iter__') and len(values) == 2:
+            self.x, self.y = values
+
+    def __add__(self, other):
+        if isinstance(other, (int, float)):
+            return LegacyVector((self.x + other, self.y + other))
+        elif isinstance(other, LegacyVector):
+            return LegacyVector((self.x + other.get_x(), self.y + other.get_y()))
+
+    def __sub__(self, other):
+        if isinstance(other, (int, float)):
+            return LegacyVector((self.x - other, self.y - other))
+        elif isinstance(other, LegacyVector):
+            return LegacyVector((self.x - other.get_x(), self.y - other.get_y()))
+
+    def __mul__(self, other):
+        if isinstance(other, (int, float)):
+            return LegacyVector((self.x * other, self.y * other))
+        elif isinstance(other, LegacyVector):
+            return self.x * other.x + self.y * other.y
+
+    def get_x(self):
+        return self.x
+
+    def get_y(self):
+        return self.y
+
+
+def integrate(cls, bodies=1000, steps=100):
+    """euler-integrates a set of bodies the way Collidable.update_body does"""
+    positions = [cls((i, i)) for i in range(bodies)]
+    velocities = [cls((1, 0.5)) for _ in range(bodies)]
+    for _ in range(steps):
+        for i in range(bodies):
+            positions[i] += velocities[i] * 0.5
+
+
+def arithmetic(cls):
+    a = cls((1, 2))
+    b = cls((3, 4))
+    return (a + b) * (a - b)
+
+
+def memory_per_vector(cls, count=10000):
+    tracemalloc.start()
+    vectors = [cls((i, i)) for i in range(count)]
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return size / len(vectors)
+
+
+def main():
+    for name, cls in (("legacy", LegacyVector), ("slotted", Vector)):
+        integration = min(timeit.repeat(lambda: integrate(cls), number=1, repeat=5))
+        ops = min(timeit.repeat(lambda: arithmetic(cls), number=100000, repeat=5))
+        print(f"{name:>8}: integrate {integration * 1000:7.2f} ms, "
+              f"100k arithmetic {ops * 1000:7.2f} ms, "
+              f"{memory_per_vector(cls):5.0f} bytes per vector")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,11 @@ import shapes
 from shapes import *
 from constants import *
 from vector import Vector
+from convex import gather_polygon_geometry, sat_push_vectors
+from parallel import ParallelNarrowphase
+from contacts import ContactSolver, collide_polygons, collide_circles, collide_circle_polygon, get_pair_key
+from bisect import bisect_left, bisect_right
+import numpy as np
 import time
 
 
@@ -30,28 +35,138 @@ class EndPoint:
         return other.value > self.value
 
 
+def endpoint_value(endpoint):
+    return endpoint.value
+
+
 class SweepPrune:
     def __init__(self, collidables):
         self.endpointsX = []
         self.endpointsY = []
         self.overlapsX = set()
         self.overlapsY = set()
+        # Each body's endpoints in bounding rect order, so its rect is fetched once per update
+        self.body_endpoints = {}
+        # Widest and tallest bounding rect, bounds how far back an interval containing a point can start
+        self.max_width = self.max_height = 0
+        # Endpoint lists are only ordered by value between get_broad_pairs and the next update_values
+        self.is_sorted = False
         for body in collidables:
-            self.endpointsX.append(EndPoint(body, Vector((0, 1)), False))
-            self.endpointsX.append(EndPoint(body, Vector((0, 1)), True))
-            self.endpointsY.append(EndPoint(body, Vector((1, 0)), False))
-            self.endpointsY.append(EndPoint(body, Vector((1, 0)), True))
+            start_x, start_y, end_x, end_y = self.make_endpoints(body)
+            self.endpointsX += [start_x, end_x]
+            self.endpointsY += [start_y, end_y]
 
         self.update_values()
+        self.sort_endpoints()
+
+    def sort_endpoints(self):
+        """sorts both endpoint lists from scratch and rebuilds the overlap sets in one sweep, far cheaper than
+            letting the insertion sort start from an arbitrary order"""
+        for endpoints, overlaps in ((self.endpointsX, self.overlapsX), (self.endpointsY, self.overlapsY)):
+            endpoints.sort(key=endpoint_value)
+            overlaps.clear()
+            active = set()
+            for endpoint in endpoints:
+                if endpoint.is_end:
+                    active.discard(endpoint.owner)
+                else:
+                    for owner in active:
+                        overlaps.add(frozenset({owner, endpoint.owner}))
+                    active.add(endpoint.owner)
+        self.is_sorted = True
+
+    def make_endpoints(self, body):
+        start_x = EndPoint(body, Vector((0, 1)), False)
+        end_x = EndPoint(body, Vector((0, 1)), True)
+        start_y = EndPoint(body, Vector((1, 0)), False)
+        end_y = EndPoint(body, Vector((1, 0)), True)
+        self.body_endpoints[body] = (start_x, start_y, end_x, end_y)
+        return start_x, start_y, end_x, end_y
 
     def update_values(self):
-        for endpoint in self.endpointsX:
-            index = 0 if not endpoint.is_end else 2
-            endpoint.value = endpoint.owner.get_bounding_rect()[index]
+        max_width = max_height = 0
+        for body, endpoints in self.body_endpoints.items():
+            if body.is_sleeping():
+                # A sleeping body hasn't moved, its endpoints still hold its rect
+                min_x, min_y, max_x, max_y = (endpoint.value for endpoint in endpoints)
+            else:
+                min_x, min_y, max_x, max_y = rect = body.get_bounding_rect()
+                for endpoint, value in zip(endpoints, rect):
+                    endpoint.value = value
+            if max_x - min_x > max_width:
+                max_width = max_x - min_x
+            if max_y - min_y > max_height:
+                max_height = max_y - min_y
+        self.max_width, self.max_height = max_width, max_height
+        self.is_sorted = False
+
+    def add(self, body):
+        """inserts a body into the sorted endpoint lists and overlap sets without rebuilding"""
+        if not self.is_sorted:
+            self.get_broad_pairs()
+
+        start_x, start_y, end_x, end_y = self.make_endpoints(body)
+        min_x, min_y, max_x, max_y = body.get_bounding_rect()
+        start_x.value, start_y.value, end_x.value, end_y.value = min_x, min_y, max_x, max_y
+        self.max_width = max(self.max_width, max_x - min_x)
+        self.max_height = max(self.max_height, max_y - min_y)
+
+        for endpoints, overlaps, start, end, extent in ((self.endpointsX, self.overlapsX, start_x, end_x,
+                                                         self.max_width),
+                                                        (self.endpointsY, self.overlapsY, start_y, end_y,
+                                                         self.max_height)):
+            # Equal values go after existing ones, as the stable insertion sort would leave them
+            start_index = bisect_right(endpoints, start.value, key=endpoint_value)
+            endpoints.insert(start_index, start)
+            end_index = bisect_right(endpoints, end.value, start_index + 1, key=endpoint_value)
+            endpoints.insert(end_index, end)
+            for owner in self.overlapping_owners(endpoints, start_index, end_index, extent):
+                overlaps.add(frozenset({body, owner}))
+
+    def remove(self, body):
+        """deletes a body's endpoints and every overlap pair it belongs to"""
+        if not self.is_sorted:
+            self.get_broad_pairs()
+
+        start_x, start_y, end_x, end_y = self.body_endpoints.pop(body)
+        for endpoints, overlaps, start, end, extent in ((self.endpointsX, self.overlapsX, start_x, end_x,
+                                                         self.max_width),
+                                                        (self.endpointsY, self.overlapsY, start_y, end_y,
+                                                         self.max_height)):
+            start_index = self.find_endpoint(endpoints, start)
+            end_index = self.find_endpoint(endpoints, end, start_index + 1)
+            for owner in self.overlapping_owners(endpoints, start_index, end_index, extent):
+                overlaps.discard(frozenset({body, owner}))
+            del endpoints[end_index]
+            del endpoints[start_index]
 
-        for endpoint in self.endpointsY:
-            index = 1 if not endpoint.is_end else 3
-            endpoint.value = endpoint.owner.get_bounding_rect()[index]
+    @staticmethod
+    def find_endpoint(endpoints, endpoint, low=0):
+        index = bisect_left(endpoints, endpoint.value, low, key=endpoint_value)
+        while endpoints[index] is not endpoint:
+            index += 1
+        return index
+
+    @staticmethod
+    def overlapping_owners(endpoints, start_index, end_index, extent):
+        """returns the owners of every interval overlapping the one bounded by the endpoints at start_index and
+            end_index, visiting only that interval and the extent-wide window before it"""
+        owners = set()
+        for endpoint in endpoints[start_index + 1:end_index]:
+            if not endpoint.is_end:
+                owners.add(endpoint.owner)
+
+        # Intervals containing the start began at most extent earlier, widened slightly to absorb rounding
+        first = bisect_left(endpoints, endpoints[start_index].value - extent - 1, 0, start_index, key=endpoint_value)
+        started = set()
+        ended = set()
+        for endpoint in endpoints[first:start_index]:
+            if endpoint.is_end:
+                ended.add(endpoint.owner)
+            else:
+                started.add(endpoint.owner)
+        owners.update(started - ended)
+        return owners
 
     @staticmethod
     def detect_overlaps(endpoints, overlaps):
@@ -80,45 +195,572 @@ class SweepPrune:
     def get_broad_pairs(self):
         self.detect_overlaps_x()
         self.detect_overlaps_y()
+        self.is_sorted = True
 
         return list(self.overlapsX.intersection(self.overlapsY))
 
+    def query_region(self, rect):
+        """returns every body whose bounding rect overlaps rect"""
+        if not self.is_sorted:
+            self.get_broad_pairs()
+        x1, y1, x2, y2 = rect
+        endpoints = self.endpointsX
+        # Overlapping intervals start before the region ends, and at most the widest rect before it begins
+        first = bisect_left(endpoints, x1 - self.max_width - 1, key=endpoint_value)
+        last = bisect_left(endpoints, x2, first, key=endpoint_value)
+        bodies = []
+        for endpoint in endpoints[first:last]:
+            if not endpoint.is_end:
+                body_rect = [end.value for end in self.body_endpoints[endpoint.owner]]
+                if rects_overlap(body_rect, rect):
+                    bodies.append(endpoint.owner)
+        return bodies
+
+
+def gather_bounds(bodies):
+    """returns the bounding rects of bodies as an (N, 4) array. When they make up a quarter or more of one world
+        the rows are taken from the rects it works out for every body at once, otherwise each body is asked"""
+    world = bodies[0].world if len(bodies) else None
+    if world is not None and 4 * len(bodies) >= len(world):
+        indices = np.fromiter((body.index if body.world is world else -1 for body in bodies), dtype=np.int64,
+                              count=len(bodies))
+        if (indices >= 0).all():
+            return world.get_body_bounds()[indices]
+    return np.array([body.get_bounding_rect() for body in bodies], dtype=float).reshape(-1, 4)
+
+
+def get_sleeping(bodies):
+    """returns which bodies are asleep as a boolean array, read from their worlds' sleep masks"""
+    return np.fromiter((body.is_sleeping() for body in bodies), dtype=bool, count=len(bodies))
+
+
+def gather_awake_bounds(bodies, bounds, sleeping):
+    """returns the bounding rects of bodies as an (N, 4) array, rereading only the awake ones. A sleeping body
+        hasn't moved, so its row of the previous bounds still holds its rect"""
+    if len(bounds) != len(bodies) or not sleeping.any():
+        return gather_bounds(bodies)
+    awake = np.flatnonzero(~sleeping)
+    bounds = bounds.copy()
+    bounds[awake] = gather_bounds([bodies[i] for i in awake.tolist()])
+    return bounds
+
+
+def bodies_in_region(bodies, bounds, rect):
+    """returns the bodies whose row of an (N, 4) bounds array overlaps rect"""
+    x1, y1, x2, y2 = rect
+    hits = (bounds[:, 0] < x2) & (x1 < bounds[:, 2]) & (bounds[:, 1] < y2) & (y1 < bounds[:, 3])
+    return [bodies[i] for i in np.flatnonzero(hits).tolist()]
+
+
+def expand_ranges(begin, count):
+    """returns (i, j) for every j in range(begin[i], begin[i] + count[i]), without a Python loop"""
+    owners = np.repeat(np.arange(len(count)), count)
+    offsets = np.arange(count.sum()) - np.repeat(np.cumsum(count) - count, count)
+    return owners, np.repeat(begin, count) + offsets
+
+
+class ArraySweepPrune:
+    """Sweep and prune with endpoints held in NumPy arrays, pairs are returned as a (K, 2) array of body indices"""
+
+    def __init__(self, collidables):
+        self.bodies = []
+        self.bounds = np.zeros((0, 4))
+        self.axis = 0
+        # Per axis endpoint arrays, kept in the order of the last sort so the next one starts nearly sorted
+        self.index = [np.zeros(0, dtype=int), np.zeros(0, dtype=int)]
+        self.is_end = [np.zeros(0, dtype=bool), np.zeros(0, dtype=bool)]
+        self.values = [np.zeros(0), np.zeros(0)]
+        self.sleeping = np.zeros(0, dtype=bool)
+        self.extend(collidables)
+
+        self.update_values(self.bounds)
+
+    def extend(self, bodies):
+        """appends endpoints for new bodies, they sort into place on the next get_pair_indices"""
+        bodies = list(bodies)
+        first = len(self.bodies)
+        self.bodies += bodies
+        self.bounds = np.concatenate((self.bounds, gather_bounds(bodies)))
+        self.sleeping = np.concatenate((self.sleeping, get_sleeping(bodies)))
+        index = np.repeat(np.arange(first, first + len(bodies)), 2)
+        is_end = np.tile((False, True), len(bodies))
+        for axis in (0, 1):
+            self.index[axis] = np.concatenate((self.index[axis], index))
+            self.is_end[axis] = np.concatenate((self.is_end[axis], is_end))
+            self.values[axis] = np.concatenate((self.values[axis], self.bounds[index, axis + 2 * is_end]))
+
+    def update_values(self, bounds=None):
+        """refreshes every endpoint with one gather from an (N, 4) bounds array. If not given it is built by
+            gather_awake_bounds, which reads the world's bounds array rather than asking each body"""
+        self.sleeping = get_sleeping(self.bodies)
+        if bounds is None:
+            bounds = gather_awake_bounds(self.bodies, self.bounds, self.sleeping)
+        self.bounds = bounds
+        for axis in (0, 1):
+            self.values[axis] = bounds[self.index[axis], axis + 2 * self.is_end[axis]]
+
+        # Sweep along whichever axis the bodies are most spread out on
+        centres = bounds[:, :2] + bounds[:, 2:]
+        if len(centres) > 1:
+            self.axis = int(np.argmax(centres.var(axis=0)))
+
+    def add(self, body):
+        self.extend([body])
+
+    def remove(self, body):
+        removed = self.bodies.index(body)
+        del self.bodies[removed]
+        self.bounds = np.delete(self.bounds, removed, axis=0)
+        self.sleeping = np.delete(self.sleeping, removed)
+        for axis in (0, 1):
+            keep = self.index[axis] != removed
+            index = self.index[axis][keep]
+            self.index[axis] = index - (index > removed)
+            self.is_end[axis] = self.is_end[axis][keep]
+            self.values[axis] = self.values[axis][keep]
+
+    def sort_axis(self, axis):
+        # Stable sort is timsort, close to linear on the nearly sorted order left by the previous frame
+        order = np.argsort(self.values[axis], kind='stable')
+        self.index[axis] = self.index[axis][order]
+        self.is_end[axis] = self.is_end[axis][order]
+        self.values[axis] = self.values[axis][order]
+
+    def get_pair_indices(self):
+        """returns every pair of overlapping bounding rects as a (K, 2) array of body indices"""
+        axis = self.axis
+        self.sort_axis(axis)
+        index, is_end = self.index[axis], self.is_end[axis]
+        n = len(self.bodies)
+
+        # A pair overlaps on the sweep axis iff the later start lies between the earlier body's endpoints
+        starts = ~is_end
+        starts_before = np.cumsum(starts) - starts
+        start_position = np.empty(n, dtype=int)
+        end_position = np.empty(n, dtype=int)
+        start_position[index[starts]] = np.flatnonzero(starts)
+        end_position[index[is_end]] = np.flatnonzero(is_end)
+        rank = starts_before[start_position]
+        count = starts_before[end_position] - rank - 1
+
+        owners, ranks = expand_ranges(rank + 1, count)
+        partners = index[starts][ranks]
+
+        other = 1 - axis
+        bounds = self.bounds
+        # Two sleeping bodies can't move each other, so their pairs are left out
+        keep = (bounds[owners, other] < bounds[partners, other + 2]) & \
+               (bounds[partners, other] < bounds[owners, other + 2]) & \
+               ~(self.sleeping[owners] & self.sleeping[partners])
+        return np.column_stack((owners[keep], partners[keep]))
+
+    def get_broad_pairs(self):
+        bodies = self.bodies
+        return [(bodies[a], bodies[b]) for a, b in self.get_pair_indices().tolist()]
+
+    def query_region(self, rect):
+        """returns every body whose bounding rect overlaps rect"""
+        return bodies_in_region(self.bodies, self.bounds, rect)
+
+
+class SpatialHashGrid:
+    """Uniform grid broadphase, every body is binned into the cells its bounding rect covers each update"""
+
+    def __init__(self, collidables, cell_size=None):
+        self.bodies = list(collidables)
+        self.bounds = np.zeros((0, 4))
+        self.sleeping = np.zeros(0, dtype=bool)
+        # Without a given cell size one is picked from the bodies, and picked again whenever they change a lot
+        self.auto_cell_size = cell_size is None
+        self.cell_size = cell_size
+        self.tuned_count = self.tuned_extent = 0     # body count and median extent the cell size was picked for
+        self.keys = self.owners = None
+
+        self.update_values()
+
+    def tune_cell_size(self):
+        """sets the cell size to four times the median bounding radius, so a typical body covers at most four cells.
+            It stays unset until there are bodies to measure, then only changes when the body count or the median
+            extent moves by GRID_RETUNE_RATIO"""
+        if not self.auto_cell_size or not len(self.bounds):
+            return
+        count = len(self.bounds)
+        extent = float(np.median(np.maximum(self.bounds[:, 2] - self.bounds[:, 0],
+                                            self.bounds[:, 3] - self.bounds[:, 1])))
+        ratio = GRID_RETUNE_RATIO
+        if self.cell_size is not None and self.tuned_count / ratio < count < self.tuned_count * ratio and \
+                self.tuned_extent / ratio <= extent <= self.tuned_extent * ratio:
+            return
+        self.cell_size = max(2 * extent, 1.0)
+        self.tuned_count, self.tuned_extent = count, extent
+
+    def update_values(self, bounds=None):
+        self.sleeping = get_sleeping(self.bodies)
+        if bounds is None:
+            bounds = gather_awake_bounds(self.bodies, self.bounds, self.sleeping)
+        self.bounds = bounds
+        self.rebin()
+
+    def rebin(self):
+        """bins every body at once: one (cell key, owner) entry per covered cell, sorted by key"""
+        self.tune_cell_size()
+        if self.cell_size is None:
+            self.keys = self.owners = np.zeros(0, dtype=np.int64)
+            return
+        cells = np.floor(self.bounds / self.cell_size).astype(np.int64)
+        widths = cells[:, 2] - cells[:, 0] + 1
+        heights = cells[:, 3] - cells[:, 1] + 1
+        owners, local = expand_ranges(np.zeros(len(cells), dtype=int), widths * heights)
+        cell_x = cells[owners, 0] + local % widths[owners]
+        cell_y = cells[owners, 1] + local // widths[owners]
+        keys = cell_x * 73856093 ^ cell_y * 19349663
+
+        order = np.argsort(keys, kind='stable')
+        self.keys = keys[order]
+        self.owners = owners[order]
+
+    def add(self, body):
+        self.bodies.append(body)
+        self.bounds = np.concatenate((self.bounds, gather_bounds([body])))
+        self.sleeping = np.append(self.sleeping, body.is_sleeping())
+        self.keys = None
+
+    def remove(self, body):
+        removed = self.bodies.index(body)
+        del self.bodies[removed]
+        self.bounds = np.delete(self.bounds, removed, axis=0)
+        self.sleeping = np.delete(self.sleeping, removed)
+        self.keys = None
+
+    def get_pair_indices(self):
+        """returns every pair of overlapping bounding rects as a (K, 2) array of body indices"""
+        if self.keys is None:
+            self.rebin()
+        keys, owners = self.keys, self.owners
+
+        # Pair up every two entries sharing a cell
+        position = np.arange(len(keys))
+        group_end = np.searchsorted(keys, keys, side='right')
+        first, second = expand_ranges(position + 1, group_end - position - 1)
+        a, b = owners[first], owners[second]
+        a, b = np.minimum(a, b), np.maximum(a, b)
+
+        # Bodies sharing several cells (or colliding hashes) appear more than once
+        n = len(self.bodies)
+        unique = np.unique(a * n + b)
+        a, b = unique // n, unique % n
+        bounds = self.bounds
+        keep = (a != b) & ~(self.sleeping[a] & self.sleeping[b]) & \
+               (bounds[a, 0] < bounds[b, 2]) & (bounds[b, 0] < bounds[a, 2]) & \
+               (bounds[a, 1] < bounds[b, 3]) & (bounds[b, 1] < bounds[a, 3])
+        return np.column_stack((a[keep], b[keep]))
+
+    def get_broad_pairs(self):
+        bodies = self.bodies
+        return [(bodies[a], bodies[b]) for a, b in self.get_pair_indices().tolist()]
+
+    def query_region(self, rect):
+        """returns every body whose bounding rect overlaps rect"""
+        return bodies_in_region(self.bodies, self.bounds, rect)
+
+
+def rect_union(a, b):
+    return [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+
+
+def rect_perimeter(rect):
+    return 2 * (rect[2] - rect[0] + rect[3] - rect[1])
+
+
+def rect_contains(outer, inner):
+    return outer[0] <= inner[0] and outer[1] <= inner[1] and inner[2] <= outer[2] and inner[3] <= outer[3]
+
+
+def rects_touch(a, b):
+    # Inclusive, used to prune tree nodes so touching rects are never skipped
+    return a[0] <= b[2] and b[0] <= a[2] and a[1] <= b[3] and b[1] <= a[3]
+
+
+def rects_overlap(a, b):
+    # Strict, matching the endpoint ordering SweepPrune produces for distinct values
+    return a[0] < b[2] and b[0] < a[2] and a[1] < b[3] and b[1] < a[3]
+
+
+def ray_rect_distance(rect, origin, direction, max_distance):
+    """returns the distance along a ray at which it enters rect (0 if it starts inside), or None if it misses"""
+    near, far = 0, max_distance
+    for axis in (0, 1):
+        if direction[axis] == 0:
+            if not rect[axis] <= origin[axis] <= rect[axis + 2]:
+                return None
+            continue
+        t1 = (rect[axis] - origin[axis]) / direction[axis]
+        t2 = (rect[axis + 2] - origin[axis]) / direction[axis]
+        if t1 > t2:
+            t1, t2 = t2, t1
+        near, far = max(near, t1), min(far, t2)
+        if near > far:
+            return None
+    return near
+
+
+class TreeNode:
+    __slots__ = ('rect', 'parent', 'left', 'right', 'height', 'body', 'order')
+
+    def __init__(self, rect, body=None, order=0):
+        self.rect = rect
+        self.parent = self.left = self.right = None
+        self.height = 0
+        self.body = body
+        self.order = order
+
+    def is_leaf(self):
+        return self.left is None
+
+
+class AABBTree:
+    """Dynamic bounding volume tree broadphase, leaves hold fattened rects so bodies are only reinserted when they
+        leave them"""
+
+    def __init__(self, collidables, margin=AABB_MARGIN, prediction=AABB_PREDICTION):
+        self.root = None
+        self.margin = margin
+        self.prediction = prediction
+        self.leaves = {}
+        self.rects = {}
+        self.inserted = 0
+        for body in collidables:
+            self.add(body)
+
+    def fatten(self, rect, dx=0, dy=0):
+        """pads rect by the margin and stretches it along the displacement predicted for the next few updates"""
+        m = self.margin
+        fat = [rect[0] - m, rect[1] - m, rect[2] + m, rect[3] + m]
+        dx *= self.prediction
+        dy *= self.prediction
+        if dx < 0:
+            fat[0] += dx
+        else:
+            fat[2] += dx
+        if dy < 0:
+            fat[1] += dy
+        else:
+            fat[3] += dy
+        return fat
+
+    def add(self, body):
+        rect = body.get_bounding_rect()
+        leaf = TreeNode(self.fatten(rect), body, self.inserted)
+        self.inserted += 1
+        self.leaves[body] = leaf
+        self.rects[body] = rect
+        self.insert_leaf(leaf)
+
+    def remove(self, body):
+        leaf = self.leaves.pop(body)
+        del self.rects[body]
+        self.remove_leaf(leaf)
+
+    def update_values(self):
+        for body, leaf in self.leaves.items():
+            if body.is_sleeping():
+                continue
+            rect = body.get_bounding_rect()
+            previous = self.rects[body]
+            self.rects[body] = rect
+            if not rect_contains(leaf.rect, rect):
+                dx = (rect[0] + rect[2] - previous[0] - previous[2]) / 2
+                dy = (rect[1] + rect[3] - previous[1] - previous[3]) / 2
+                self.remove_leaf(leaf)
+                leaf.rect = self.fatten(rect, dx, dy)
+                self.insert_leaf(leaf)
+
+    def insert_leaf(self, leaf):
+        if self.root is None:
+            self.root = leaf
+            leaf.parent = None
+            return
+
+        # Descend towards the sibling that grows the total perimeter of the tree least
+        node = self.root
+        while not node.is_leaf():
+            perimeter = rect_perimeter(node.rect)
+            combined = rect_perimeter(rect_union(node.rect, leaf.rect))
+            cost = 2 * combined
+            inheritance = 2 * (combined - perimeter)
+            cost_left = self.descend_cost(node.left, leaf.rect, inheritance)
+            cost_right = self.descend_cost(node.right, leaf.rect, inheritance)
+            if cost < cost_left and cost < cost_right:
+                break
+            node = node.left if cost_left < cost_right else node.right
+
+        sibling = node
+        parent = TreeNode(rect_union(sibling.rect, leaf.rect))
+        parent.height = sibling.height + 1
+        self.replace_child(sibling.parent, sibling, parent)
+        parent.left, parent.right = sibling, leaf
+        sibling.parent = leaf.parent = parent
+        self.refit(parent.parent)
+
+    @staticmethod
+    def descend_cost(child, rect, inheritance):
+        grown = rect_perimeter(rect_union(child.rect, rect))
+        if child.is_leaf():
+            return grown + inheritance
+        return grown - rect_perimeter(child.rect) + inheritance
+
+    def remove_leaf(self, leaf):
+        if leaf is self.root:
+            self.root = None
+            return
+
+        parent = leaf.parent
+        sibling = parent.right if parent.left is leaf else parent.left
+        self.replace_child(parent.parent, parent, sibling)
+        leaf.parent = None
+        self.refit(sibling.parent)
+
+    def replace_child(self, parent, old, new):
+        new.parent = parent
+        if parent is None:
+            self.root = new
+        elif parent.left is old:
+            parent.left = new
+        else:
+            parent.right = new
+
+    def refit(self, node):
+        while node is not None:
+            node = self.balance(node)
+            node.height = 1 + max(node.left.height, node.right.height)
+            node.rect = rect_union(node.left.rect, node.right.rect)
+            node = node.parent
+
+    def balance(self, node):
+        if node.is_leaf() or node.height < 2:
+            return node
+        difference = node.right.height - node.left.height
+        if difference > 1:
+            return self.rotate(node, node.right)
+        if difference < -1:
+            return self.rotate(node, node.left)
+        return node
+
+    def rotate(self, node, child):
+        """promotes the taller child above node, node takes over the shorter of that child's children"""
+        left, right = child.left, child.right
+        self.replace_child(node.parent, node, child)
+        taller, shorter = (left, right) if left.height > right.height else (right, left)
+        if node.left is child:
+            node.left = shorter
+        else:
+            node.right = shorter
+        shorter.parent = node
+        child.left, child.right = node, taller
+        node.parent = child
+
+        node.height = 1 + max(node.left.height, node.right.height)
+        node.rect = rect_union(node.left.rect, node.right.rect)
+        child.height = 1 + max(node.height, taller.height)
+        child.rect = rect_union(node.rect, taller.rect)
+        return child
+
+    def query_leaves(self, rect):
+        if self.root is None:
+            return
+        stack = [self.root]
+        while stack:
+            node = stack.pop()
+            if not rects_touch(node.rect, rect):
+                continue
+            if node.is_leaf():
+                if rects_overlap(self.rects[node.body], rect):
+                    yield node
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+
+    def query_region(self, rect):
+        """returns every body whose bounding rect overlaps rect"""
+        return [leaf.body for leaf in self.query_leaves(rect)]
+
+    def query_ray(self, origin, direction, max_distance=float('inf')):
+        """returns (distance, body) for every bounding rect hit by the ray, nearest first"""
+        hits = []
+        stack = [self.root] if self.root is not None else []
+        while stack:
+            node = stack.pop()
+            if ray_rect_distance(node.rect, origin, direction, max_distance) is None:
+                continue
+            if node.is_leaf():
+                distance = ray_rect_distance(self.rects[node.body], origin, direction, max_distance)
+                if distance is not None:
+                    hits.append((distance, node.body))
+            else:
+                stack.append(node.left)
+                stack.append(node.right)
+        hits.sort(key=lambda hit: hit[0])
+        return hits
+
+    def get_broad_pairs(self):
+        pairs = []
+        for body, leaf in self.leaves.items():
+            for other in self.query_leaves(self.rects[body]):
+                if other.order > leaf.order:
+                    pairs.append((body, other.body))
+        return pairs
+
+
+BROADPHASES = {
+    "sweep": SweepPrune,
+    "array_sweep": ArraySweepPrune,
+    "grid": SpatialHashGrid,
+    "tree": AABBTree,
+}
+
+
+def make_broadphase(collidables, method=None):
+    """builds the broadphase named by method, defaulting to BROADPHASE from constants"""
+    if method is None:
+        method = BROADPHASE
+    return BROADPHASES[method](collidables)
+
+
+# Narrowphase routine for each pair of shape types, CollisionHandler.handlers maps these to its methods
+COLLISION_TYPES = {(Polygon, Polygon): COLLISION_POLYGON_POLYGON,
+                   (Circle, Polygon): COLLISION_CIRCLE_POLYGON,
+                   (Polygon, Circle): COLLISION_CIRCLE_POLYGON,
+                   (Circle, Circle): COLLISION_CIRCLE_CIRCLE}
+
 
 class CollisionHandler:
-    def __init__(self):
-        pass
-
-    def find_minimum_push_vector(self, object1, object2):
-
-        def is_overlap(interval1, interval2):
-            a, b = interval1
-            c, d = interval2
-            return a <= d and c <= b
-
-        push_vector = Vector((1000, 1000))
-        for axis in object1.shape.get_axis():
-            axis = axis.rotate(object1.orientation)
-            interval1 = object2.project(axis)
-            interval2 = object1.project(axis)
-            if not is_overlap(interval1, interval2):
-                return Vector()
-            v = axis * (interval2[0] - interval1[1])
-            if abs(v) < abs(push_vector):
-                push_vector = -v
-
-        for axis in object2.shape.get_axis():
-            axis = axis.rotate(object2.orientation)
-            interval1 = object1.project(axis)
-            interval2 = object2.project(axis)
-            if not is_overlap(interval1, interval2):
-                return Vector()
-            v = axis * (interval2[0] - interval1[1])
-            if abs(v) < abs(push_vector):
-                push_vector = v
-        push_vector *= 1.05
-
-        # print("overlap",push_vector)
-        # print(object1.mass, object2.mass)
+    def __init__(self, iterations=None, processes=None):
+        self.solver = ContactSolver(iterations)
+        # Polygon pairs are spread over worker processes when more than one is configured
+        processes = NARROWPHASE_PROCESSES if processes is None else processes
+        self.parallel = ParallelNarrowphase(processes) if processes > 1 else None
+        self.handlers = {COLLISION_POLYGON_POLYGON: self.handle_poly_poly,
+                         COLLISION_CIRCLE_POLYGON: self.handle_circle_poly,
+                         COLLISION_CIRCLE_CIRCLE: self.handle_circle_circle}
+
+    def find_push_vectors(self, pairs):
+        """finds the minimum push vectors of polygon pairs by separating axes, every vertex of every pair is projected
+            onto every axis of that pair in one array computation. Returns a (K, 2) array of push vectors, zero for
+            pairs that are separated"""
+        if not pairs:
+            return np.zeros((0, 2))
+
+        rows = {}
+        for pair in pairs:
+            for body in pair:
+                rows.setdefault(body, len(rows))
+        vertices, axes, _ = gather_polygon_geometry(list(rows))
+        first = np.array([rows[pair[0]] for pair in pairs])
+        second = np.array([rows[pair[1]] for pair in pairs])
+        return sat_push_vectors(vertices, axes, first, second)
+
+    def separate(self, object1, object2, push_vector):
+        """moves two overlapping objects apart along push_vector, high priority objects stay put"""
         if object1.is_high_priority() and not object2.is_high_priority():
             object2.position -= push_vector
         elif object2.is_high_priority() and not object1.is_high_priority():
@@ -128,148 +770,76 @@ class CollisionHandler:
             object2.position -= push_vector / 2
         #   else evaluate collisions based on the mass of the two objects
 
-    def check_vertex_vertex(self, vertex1, vertex2, tolerance=None):
-        if tolerance is None:
-            tolerance = COLLISION_TOLERANCE
-
-        normal = None
-        if abs(vertex2 - vertex1) < tolerance:
-            normal = (vertex2 - vertex1).normalise()
-
-        return normal
-
-    def check_vertex_edge(self, vertex, edge1, edge2, tolerance=None):
-        if tolerance is None:
-            tolerance = COLLISION_TOLERANCE
-
-        normal = None
-        edge = edge2 - edge1
-        u = edge.normalise()
-        p = vertex - edge1
-
-        projection = u * (p * u)
-
-        if abs(p ^ u) < tolerance and 0 < p * p < edge * p:
-            normal = u.rotate(90)
-
-        return normal
-
-    def apply_impulse(self, object1, object2, normals):
-        position = Vector()
-        normal = Vector()
-        for n in normals:
-            position += n[0]
-            normal += n[1]
-        # position = (position/len(normals))
-        # normal = (normal/len(normals)).normalise()
-        normal = normals[0][1]
-        position = normals[0][0]
-        ##        relative_norm_vel = normal/abs(normal) * (object1.linear_velocity - object2.linear_velocity)
-        ##        normal /= abs(normal)
-        ##        numerator = -2*relative_norm_vel
-        ##        denominator = normal * normal * (object1.mass + object2.mass)/(object1.mass * object2.mass)
-        ##        impulse = numerator/denominator
-        ##        object1.linear_velocity += normal * impulse/object1.mass
-        ##        object2.linear_velocity -= normal * impulse/object2.mass
-        ##
-        ##        return 0
-
-        local_position1 = object1.global_to_local(position)
-        local_position2 = object2.global_to_local(position)
-
-        relative_velocity = object2.get_point_velocity(local_position2) - \
-                            object1.get_point_velocity(local_position1)
-        print(relative_velocity)
-        # print(object2.get_point_velocity(local_position2),
-        #      object1.get_point_velocity(local_position1))
-        # print(relative_velocity)
-        relative_norm_vel = relative_velocity * normal
-        print(relative_velocity)
-        # print(relative_norm_vel)
-
-        if relative_norm_vel < 0:
-            numerator = -(1 + COEFFICIENT_RESTITUTION) * relative_norm_vel
-            inverse_mass_sum = 1 / object1.get_mass() + 1 / object2.get_mass()
-            normal_moment1 = (normal * (local_position1 ^ normal) ^ local_position1) / object1.get_inertia()
-            normal_moment2 = (normal * (local_position2 ^ normal) ^ local_position2) / object2.get_inertia()
-            impulse = numerator / (inverse_mass_sum + normal_moment1 + normal_moment2)
-            object1.resolve_impulse(impulse, local_position1, normal)
-            object2.resolve_impulse(-impulse, local_position2, normal)
-
     def handle_poly_poly(self, poly1, poly2):
-        point_normals = list()
-        verts1 = poly1.shape.get_transformed_vertices([poly1.get_space()])
-        verts2 = poly2.shape.get_transformed_vertices([poly2.get_space()])
-
-        # Find vertex-vertex collision points and normals
-        for v1 in verts1:
-            for v2 in verts2:
-                normal = self.check_vertex_vertex(v1, v2)
-                if normal is not None:
-                    point_normals.append([v1, normal])
-
-        for i in range(len(verts1)):
-            edge1 = verts1[i]
-            edge2 = verts1[(i + 1) % len(verts1)]
-            for vertex in verts2:
-                normal = self.check_vertex_edge(vertex, edge1, edge2)
-                if normal is not None:
-                    point_normals.append([vertex, -normal])
-
-        for i in range(len(verts2)):
-            edge1 = verts2[i]
-            edge2 = verts2[(i + 1) % len(verts2)]
-            for vertex in verts1:
-                normal = self.check_vertex_edge(vertex, edge1, edge2)
-                if normal is not None:
-                    point_normals.append([vertex, normal])
-        if point_normals:
-            self.apply_impulse(poly1, poly2, point_normals)
-        return point_normals
+        """returns the clipped contact manifold of two polygon bodies, or None if they aren't touching"""
+        return collide_polygons(*get_pair_key(poly1, poly2))
+
+    def handle_circle_circle(self, circle1, circle2):
+        return self.separate_manifold(collide_circles, *get_pair_key(circle1, circle2))
+
+    def handle_circle_poly(self, circle, polygon):
+        if isinstance(circle.shape, Polygon):
+            circle, polygon = polygon, circle
+        return self.separate_manifold(collide_circle_polygon, circle, polygon)
+
+    def separate_manifold(self, collide, body1, body2):
+        """pushes overlapping bodies apart along the manifold normal, as find_push_vectors does for polygons, and
+            returns the manifold at their new positions"""
+        manifold = collide(body1, body2)
+        if manifold is not None and manifold.contacts[0].separation < 0:
+            self.separate(body1, body2, manifold.normal * (manifold.contacts[0].separation * 1.05))
+            manifold = collide(body1, body2)
+        return manifold
 
     def notify(self, pairs):
+        # Pairs are solved in a fixed order, not the order the broadphase found them in, so every run is the same
+        pairs = sorted((get_pair_key(*pair) for pair in pairs), key=lambda pair: (pair[0].serial, pair[1].serial))
+        polygon_pairs, other_pairs = [], []
         for pair in pairs:
             collidable1, collidable2 = pair
-            if isinstance(collidable1.shape, Polygon) and isinstance(collidable2.shape, Polygon):
-                self.find_minimum_push_vector(collidable1, collidable2)
-                self.handle_poly_poly(collidable1, collidable2)
-                pass
+            if not (self.is_active(collidable1) or self.is_active(collidable2)):
+                continue
+            collision_type = COLLISION_TYPES[type(collidable1.shape), type(collidable2.shape)]
+            if collision_type == COLLISION_POLYGON_POLYGON:
+                polygon_pairs.append((collidable1, collidable2))
+            else:
+                other_pairs.append((collision_type, collidable1, collidable2))
+
+        # Every polygon pair's push vector comes from the same positions, then they are applied in turn and the
+        # manifolds are found once every pair has been pushed
+        push_vectors = self.find_push_vectors(polygon_pairs)
+        for (collidable1, collidable2), (x, y) in zip(polygon_pairs, push_vectors.tolist()):
+            if x or y:
+                self.separate(collidable1, collidable2, Vector(x, y))
+        if self.parallel is not None:
+            manifolds = self.parallel.collide([get_pair_key(*pair) for pair in polygon_pairs])
+        else:
+            manifolds = [self.handle_poly_poly(collidable1, collidable2) for collidable1, collidable2 in polygon_pairs]
+
+        for collision_type, collidable1, collidable2 in other_pairs:
+            manifolds.append(self.handlers[collision_type](collidable1, collidable2))
 
+        manifolds = [manifold for manifold in manifolds if manifold is not None]
+        for manifold in manifolds:
+            # Being touched by an active body wakes a sleeping one, and with it the rest of its island
+            if manifold.body1.is_sleeping() and self.is_active(manifold.body2):
+                manifold.body1.wake()
+            if manifold.body2.is_sleeping() and self.is_active(manifold.body1):
+                manifold.body2.wake()
+        self.solver.solve(manifolds)
 
-def check_vertex_edge(object1, object2):
-    for i in range(object1.shape.order):
-        v1 = object1.shape.get_transformed_vertices([object1.get_space()])[i]
-        v2 = object1.shape.get_transformed_vertices([object1.get_space()])[(i + 1) % object1.shape.order]
-        edge = v2 - v1
-        u = edge.normalise()
-        for v3 in object2.shape.get_transformed_vertices([object2.get_space()]):
-            p = (v3 - v1)
-            proj = u * (p * u)
-            if abs(p ^ u) < 2 and 0 < p * p < edge * p:
-                print("vertex-edge")
-                return v3
-
-    return 0
-
-
-def do_narrow_phase(pairs):
-    for pair in pairs:
-        object1, object2 = pair
-        if isinstance(object1.shape, Polygon) and isinstance(object2.shape, Polygon):
-
-            for v1 in object1.shape.get_transformed_vertices([object1.get_space()]):
-                for v2 in object2.shape.get_transformed_vertices([object2.get_space()]):
-                    if abs(v1 - v2) < 2:
-                        print("vertex-vertex")
-                        return v1
-
-            v = check_vertex_edge(object1, object2)
-            if v:
-                return v
-            v = check_vertex_edge(object2, object1)
-            if v:
-                return v
-
-            # check vertex-edge collisions
-            # check intersection
-            pass
+    def close(self):
+        """shuts down the narrowphase worker processes, if there are any"""
+        if self.parallel is not None:
+            self.parallel.close()
+
+    @staticmethod
+    def is_active(body):
+        """returns whether a body can push what it touches, sleeping bodies can't and nor can resting high priority
+            ones, since nothing pushes them back"""
+        if body.is_sleeping():
+            return False
+        if body.is_high_priority():
+            velocity = body.linear_velocity
+            return bool(velocity.x or velocity.y or body.angular_velocity)
+        return True
@@ -18,12 +18,36 @@ DRAW_TRIS			= True
 DRAW_BOXES			= True
 BOX_COLOUR			= (150, 0, 0)
 
+TRAIL_COLOUR		= (0, 0, 200)
+TRAIL_LENGTH		= 50	# points kept per trail
+TRAIL_DECIMATION	= 1		# record one position in every this many
+
 # Simulation settings:
 COEFFICIENT_RESTITUTION = 1
+RESTITUTION_THRESHOLD	= 1		# approach speed in pixels per tick below which contacts don't bounce
+CONTACT_ITERATIONS	= 8		# sequential impulse passes over every contact per step
 PIXELS_PER_METER	= 10
 MAXIMUM_COLLIDABLES = 50
 
 COLLISION_TOLERANCE = 4
+GJK_ITERATIONS		= 32	# limit on GJK and EPA iterations per query
+GJK_TOLERANCE		= 1e-6	# distance in pixels under which GJK and EPA count as converged
+POINT_TOLERANCE		= 1e-9	# distance in pixels outside a shape at which a point still counts as on it
+
+BROADPHASE			= "sweep"	# any key of collisions.BROADPHASES
+AABB_MARGIN			= 4		# padding of AABBTree leaves in pixels
+AABB_PREDICTION		= 4		# AABBTree leaves stretch this many updates of displacement ahead
+GRID_RETUNE_RATIO	= 2		# SpatialHashGrid picks a new cell size once the body count or median size changes this much
+NARROWPHASE_PROCESSES	= 0		# worker processes for the polygon narrowphase, 0 or 1 keeps it in this process
+NARROWPHASE_BATCH	= 256	# polygon pairs sent to a worker at a time
 
 MAX_BACKSTEPS = 3
 
+SLEEP_LINEAR_VELOCITY	= 0.05	# pixels per tick under which a body counts as resting
+SLEEP_ANGULAR_VELOCITY	= 0.002	# radians per tick under which a body counts as resting
+TIME_TO_SLEEP		= 0.5	# seconds an island must rest before it sleeps
+
+TICKS_PER_SECOND	= 60			# velocities are in pixels (or radians) per tick
+FIXED_TIMESTEP		= 1 / 60		# seconds of simulated time per physics step
+MAX_SUBSTEPS		= 5				# physics steps allowed per frame before the backlog is dropped
+
@@ -0,0 +1,276 @@
+from vector import Vector
+from convex import convex_query
+from constants import *
+
+# Contact manifolds between bodies and the sequential impulse solver that resolves them. Manifolds are kept
+# between ticks so the solver can start from last tick's impulses rather than from nothing (warm starting).
+
+REFERENCE_BIAS = 0.02   # the second body's face must line up this much better to become the reference face
+
+
+class Contact:
+    __slots__ = ('point', 'separation', 'feature', 'normal_impulse', 'r1', 'r2', 'normal_mass', 'bias')
+
+    def __init__(self, point, separation, feature):
+        self.point = point
+        self.separation = separation
+        self.feature = feature      # which edges and vertices made this contact, matched between ticks
+        self.normal_impulse = 0     # accumulated over solver iterations, carried into the next tick
+
+        # Set by ContactSolver.prepare
+        self.r1 = self.r2 = None
+        self.normal_mass = self.bias = 0
+
+
+class Manifold:
+    """Up to two contact points between two bodies sharing one normal, pointing from body1 to body2"""
+
+    __slots__ = ('body1', 'body2', 'normal', 'contacts')
+
+    def __init__(self, body1, body2, normal, contacts):
+        self.body1 = body1
+        self.body2 = body2
+        self.normal = normal
+        self.contacts = contacts
+
+    def get_point_normals(self):
+        return [[contact.point, self.normal] for contact in self.contacts]
+
+
+def get_pair_key(body1, body2):
+    """returns the pair in a fixed order, so the same two bodies always give the same manifold"""
+    return (body1, body2) if body1.serial < body2.serial else (body2, body1)
+
+
+def clip_segment(points, normal, offset):
+    """keeps the parts of a segment of (point, feature) pairs with point * normal <= offset"""
+    (p1, f1), (p2, f2) = points
+    d1, d2 = p1 * normal - offset, p2 * normal - offset
+    clipped = [(p, f) for (p, f), d in ((points[0], d1), (points[1], d2)) if d <= 0]
+    if d1 * d2 < 0:
+        # The segment crosses the plane, the new point is labelled by the vertex that was cut off
+        point = p1 + (p2 - p1) * (d1 / (d1 - d2))
+        clipped.append((point, f1 if d1 > 0 else f2))
+    return clipped
+
+
+def collide_polygons(body1, body2, tolerance=None):
+    """returns the manifold of two polygon bodies closer than tolerance, or None, by clipping the incident edge
+        against the sides of the reference face"""
+    if tolerance is None:
+        tolerance = COLLISION_TOLERANCE
+    result = convex_query(body1, body2)
+    if result.distance >= tolerance:
+        return None
+    normal = result.normal
+
+    # Polygon axes point inwards, the faces' outward normals are their negatives
+    normals1 = [-axis for axis in body1.get_world_axes()]
+    normals2 = [-axis for axis in body2.get_world_axes()]
+    edge1 = max(range(len(normals1)), key=lambda i: normals1[i] * normal)
+    edge2 = max(range(len(normals2)), key=lambda i: -(normals2[i] * normal))
+
+    flip = normals2[edge2] * -normal > normals1[edge1] * normal + REFERENCE_BIAS
+    if flip:
+        reference, incident, reference_edge, incident_normals = body2, body1, edge2, normals1
+        reference_normal = normals2[edge2]
+    else:
+        reference, incident, reference_edge, incident_normals = body1, body2, edge1, normals2
+        reference_normal = normals1[edge1]
+
+    incident_edge = min(range(len(incident_normals)), key=lambda i: incident_normals[i] * reference_normal)
+    reference_vertices = reference.get_world_vertices()
+    incident_vertices = incident.get_world_vertices()
+    v1 = reference_vertices[reference_edge]
+    v2 = reference_vertices[(reference_edge + 1) % len(reference_vertices)]
+    i1 = incident_edge
+    i2 = (incident_edge + 1) % len(incident_vertices)
+
+    tangent = (v2 - v1).normalise()
+    points = [(incident_vertices[i1], (flip, reference_edge, i1)), (incident_vertices[i2], (flip, reference_edge, i2))]
+    points = clip_segment(points, -tangent, -(tangent * v1))
+    if len(points) < 2:
+        return None
+    points = clip_segment(points, tangent, tangent * v2)
+    if len(points) < 2:
+        return None
+
+    contacts = []
+    face_offset = reference_normal * v1
+    for point, feature in points:
+        separation = reference_normal * point - face_offset
+        if separation < tolerance:
+            # Halfway between the incident point and the reference face
+            contacts.append(Contact(point - reference_normal * (separation / 2), separation, feature))
+    if not contacts:
+        return None
+    return Manifold(body1, body2, -reference_normal if flip else reference_normal, contacts)
+
+
+class SolverBody:
+    """Working copy of a body's velocity and inverse mass, written back once the solver is done"""
+
+    __slots__ = ('body', 'position', 'linear_velocity', 'angular_velocity', 'inverse_mass', 'inverse_inertia')
+
+    def __init__(self, body, is_static=False):
+        self.body = body
+        self.position = body.position
+        self.linear_velocity = body.linear_velocity
+        self.angular_velocity = body.angular_velocity
+        self.inverse_mass = 0 if is_static else 1 / body.get_mass()
+        self.inverse_inertia = 0 if is_static else 1 / body.get_inertia()
+
+    def get_point_velocity(self, r):
+        return self.linear_velocity + r.rotate90() * self.angular_velocity
+
+    def apply_impulse(self, impulse, r):
+        self.linear_velocity += impulse * self.inverse_mass
+        self.angular_velocity += (r ^ impulse) * self.inverse_inertia
+
+    def write_back(self):
+        self.body.linear_velocity = self.linear_velocity
+        self.body.angular_velocity = self.angular_velocity
+
+
+class ContactSolver:
+    """Sequential impulse solver over every manifold of a tick, warm started from the contact cache"""
+
+    def __init__(self, iterations=None):
+        self.iterations = CONTACT_ITERATIONS if iterations is None else iterations
+        self.manifolds = {}     # contact cache, pair key -> the manifold solved last tick
+
+    def update(self, manifolds):
+        """replaces the cache with this tick's manifolds, carrying impulses over to contacts that persist"""
+        cache = {}
+        for manifold in manifolds:
+            key = (manifold.body1, manifold.body2)
+            previous = self.manifolds.get(key)
+            if previous is not None:
+                impulses = {contact.feature: contact.normal_impulse for contact in previous.contacts}
+                for contact in manifold.contacts:
+                    contact.normal_impulse = impulses.get(contact.feature, 0)
+            cache[key] = manifold
+        self.manifolds = cache
+
+    def solve(self, manifolds):
+        self.update(manifolds)
+        solver_bodies = {}
+        for manifold in self.manifolds.values():
+            self.prepare(manifold, solver_bodies)
+        # Only once every contact has read the bodies' velocities, warm starting any earlier would look like an
+        # approach to the contacts after it and make them bounce
+        for manifold in self.manifolds.values():
+            self.warm_start(manifold, solver_bodies)
+        for _ in range(self.iterations):
+            for manifold in self.manifolds.values():
+                self.solve_manifold(manifold, solver_bodies)
+        for solver_body in solver_bodies.values():
+            solver_body.write_back()
+
+    @staticmethod
+    def get_solver_body(body, solver_bodies):
+        solver_body = solver_bodies.get(body)
+        if solver_body is None:
+            # High priority bodies are immovable, decided by the body alone so it is the same in every manifold
+            solver_body = solver_bodies[body] = SolverBody(body, body.is_high_priority())
+        return solver_body
+
+    def prepare(self, manifold, solver_bodies):
+        """works out each contact's effective mass and restitution target"""
+        body1 = self.get_solver_body(manifold.body1, solver_bodies)
+        body2 = self.get_solver_body(manifold.body2, solver_bodies)
+        normal = manifold.normal
+        for contact in manifold.contacts:
+            contact.r1 = contact.point - body1.position
+            contact.r2 = contact.point - body2.position
+            rn1, rn2 = contact.r1 ^ normal, contact.r2 ^ normal
+            mass = body1.inverse_mass + body2.inverse_mass + \
+                body1.inverse_inertia * rn1 * rn1 + body2.inverse_inertia * rn2 * rn2
+            contact.normal_mass = 1 / mass if mass else 0
+
+            # Only bounce off fast approaches, resting contacts would otherwise never settle
+            normal_velocity = (body2.get_point_velocity(contact.r2) - body1.get_point_velocity(contact.r1)) * normal
+            contact.bias = 0
+            if normal_velocity < -RESTITUTION_THRESHOLD:
+                contact.bias = -COEFFICIENT_RESTITUTION * normal_velocity
+
+    def warm_start(self, manifold, solver_bodies):
+        """applies the impulses carried over from last tick"""
+        body1, body2 = solver_bodies[manifold.body1], solver_bodies[manifold.body2]
+        for contact in manifold.contacts:
+            if contact.normal_impulse:
+                impulse = manifold.normal * contact.normal_impulse
+                body1.apply_impulse(-impulse, contact.r1)
+                body2.apply_impulse(impulse, contact.r2)
+
+    def solve_manifold(self, manifold, solver_bodies):
+        body1, body2 = solver_bodies[manifold.body1], solver_bodies[manifold.body2]
+        normal = manifold.normal
+        for contact in manifold.contacts:
+            normal_velocity = (body2.get_point_velocity(contact.r2) - body1.get_point_velocity(contact.r1)) * normal
+            change = contact.normal_mass * (contact.bias - normal_velocity)
+
+            # Clamp the total rather than the change, so later iterations can take back an overshoot
+            total = max(contact.normal_impulse + change, 0)
+            change = total - contact.normal_impulse
+            contact.normal_impulse = total
+
+            impulse = normal * change
+            body1.apply_impulse(-impulse, contact.r1)
+            body2.apply_impulse(impulse, contact.r2)
+
+
+def collide_circles(body1, body2, tolerance=None):
+    """returns the single contact manifold of two circle bodies closer than tolerance, or None"""
+    if tolerance is None:
+        tolerance = COLLISION_TOLERANCE
+    centre1 = body1.local_to_global(body1.shape.get_centroid())
+    centre2 = body2.local_to_global(body2.shape.get_centroid())
+    radius1, radius2 = body1.shape.radius, body2.shape.radius
+
+    offset = centre2 - centre1
+    distance = abs(offset)
+    separation = distance - radius1 - radius2
+    if separation >= tolerance:
+        return None
+    normal = offset / distance if distance else Vector(1, 0)
+    point = centre1 + normal * (radius1 + separation / 2)
+    return Manifold(body1, body2, normal, [Contact(point, separation, ())])
+
+
+def collide_circle_polygon(circle, polygon, tolerance=None):
+    """returns the contact manifold of a circle body and a polygon body closer than tolerance, or None, from the
+        face of the polygon the circle's centre is furthest outside and that face's end vertices"""
+    if tolerance is None:
+        tolerance = COLLISION_TOLERANCE
+    centre = circle.local_to_global(circle.shape.get_centroid())
+    radius = circle.shape.radius
+    vertices = polygon.get_world_vertices()
+    axes = polygon.get_world_axes()
+
+    # Polygon axes point inwards, so the separation from face i is -axes[i] * (centre - vertices[i])
+    face = max(range(len(vertices)), key=lambda i: axes[i] * (vertices[i] - centre))
+    face_separation = axes[face] * (vertices[face] - centre)
+    if face_separation - radius >= tolerance:
+        return None
+
+    v1, v2 = vertices[face], vertices[(face + 1) % len(vertices)]
+    if face_separation > 0 and (centre - v1) * (v2 - v1) <= 0:
+        feature, closest = ('vertex', face), v1
+    elif face_separation > 0 and (centre - v2) * (v1 - v2) <= 0:
+        feature, closest = ('vertex', (face + 1) % len(vertices)), v2
+    else:
+        # Facing the edge, or the centre is inside the polygon, either way the face normal separates them
+        separation = face_separation - radius
+        normal = axes[face]
+        point = centre + normal * (radius + separation / 2)
+        return Manifold(circle, polygon, normal, [Contact(point, separation, ('face', face))])
+
+    offset = closest - centre
+    distance = abs(offset)
+    separation = distance - radius
+    if separation >= tolerance:
+        return None
+    normal = offset / distance
+    point = centre + normal * (radius + separation / 2)
+    return Manifold(circle, polygon, normal, [Contact(point, separation, feature)])
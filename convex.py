@@ -0,0 +1,233 @@
+import numpy as np
+from vector import Vector
+from constants import *
+
+# GJK distance and EPA penetration queries between any two convex Collidables. Both work on the shapes' cores
+# (see Shape.support) and account for the support radius afterwards, so circles stay exact.
+
+
+class SupportPoint:
+    """A vertex of the Minkowski difference A - B, remembering the points of A and B it came from"""
+
+    __slots__ = ('a', 'b', 'w', 'u')
+
+    def __init__(self, a, b):
+        self.a = a
+        self.b = b
+        self.w = a - b
+        self.u = 1
+
+
+class ConvexResult:
+    """Outcome of a convex query, the normal points from the first body towards the second"""
+
+    __slots__ = ('distance', 'point1', 'point2', 'normal')
+
+    def __init__(self, distance, point1, point2, normal):
+        self.distance = distance    # separation, negative when the bodies overlap
+        self.point1 = point1        # closest (or deepest) point on the first body
+        self.point2 = point2        # closest (or deepest) point on the second body
+        self.normal = normal
+
+    def is_colliding(self):
+        return self.distance < 0
+
+    def get_depth(self):
+        return max(-self.distance, 0)
+
+    def __repr__(self):
+        return f"ConvexResult({self.distance}, {self.point1}, {self.point2}, {self.normal})"
+
+
+def support(body1, body2, direction):
+    return SupportPoint(body1.support(direction), body2.support(-direction))
+
+
+def solve_segment(simplex):
+    """reduces a two point simplex to the feature closest to the origin, setting barycentric weights"""
+    s1, s2 = simplex
+    e12 = s2.w - s1.w
+    d12_2 = -(s1.w * e12)
+    if d12_2 <= 0:
+        s1.u = 1
+        return [s1]
+    d12_1 = s2.w * e12
+    if d12_1 <= 0:
+        s2.u = 1
+        return [s2]
+    total = d12_1 + d12_2
+    s1.u, s2.u = d12_1 / total, d12_2 / total
+    return simplex
+
+
+def solve_triangle(simplex):
+    """reduces a three point simplex to the feature closest to the origin, keeping all three if it contains it"""
+    s1, s2, s3 = simplex
+    w1, w2, w3 = s1.w, s2.w, s3.w
+
+    e12 = w2 - w1
+    d12_1, d12_2 = w2 * e12, -(w1 * e12)
+    e13 = w3 - w1
+    d13_1, d13_2 = w3 * e13, -(w1 * e13)
+    e23 = w3 - w2
+    d23_1, d23_2 = w3 * e23, -(w2 * e23)
+
+    n123 = e12 ^ e13
+    d123_1 = n123 * (w2 ^ w3)
+    d123_2 = n123 * (w3 ^ w1)
+    d123_3 = n123 * (w1 ^ w2)
+
+    if d12_2 <= 0 and d13_2 <= 0:
+        s1.u = 1
+        return [s1]
+    if d12_1 > 0 and d12_2 > 0 and d123_3 <= 0:
+        return solve_segment([s1, s2])
+    if d13_1 > 0 and d13_2 > 0 and d123_2 <= 0:
+        return solve_segment([s1, s3])
+    if d12_1 <= 0 and d23_2 <= 0:
+        s2.u = 1
+        return [s2]
+    if d13_1 <= 0 and d23_1 <= 0:
+        s3.u = 1
+        return [s3]
+    if d23_1 > 0 and d23_2 > 0 and d123_1 <= 0:
+        return solve_segment([s2, s3])
+
+    total = d123_1 + d123_2 + d123_3
+    s1.u, s2.u, s3.u = d123_1 / total, d123_2 / total, d123_3 / total
+    return simplex
+
+
+def gjk(body1, body2, max_iterations=GJK_ITERATIONS, tolerance=GJK_TOLERANCE):
+    """finds the closest points of the two bodies' cores. Returns the final simplex and its closest point to the
+        origin, which is (0, 0) when the cores overlap"""
+    direction = body2.position - body1.position
+    if direction.x == 0 and direction.y == 0:
+        direction = Vector(1, 0)
+    simplex = [support(body1, body2, -direction)]
+
+    for _ in range(max_iterations):
+        if len(simplex) == 2:
+            simplex = solve_segment(simplex)
+        elif len(simplex) == 3:
+            simplex = solve_triangle(simplex)
+            if len(simplex) == 3:
+                return simplex, Vector(0, 0)
+
+        closest = sum((s.w * s.u for s in simplex), Vector(0, 0))
+        if abs(closest) <= tolerance:
+            return simplex, Vector(0, 0)
+
+        direction = -closest
+        new = support(body1, body2, direction)
+        # Stop when the new support point gets no closer to the origin than the simplex already is
+        if (new.w - closest) * direction <= tolerance * abs(direction) or \
+                any(abs(new.w - s.w) <= tolerance for s in simplex):
+            return simplex, closest
+        simplex.append(new)
+
+    return simplex, sum((s.w * s.u for s in simplex), Vector(0, 0))
+
+
+def closest_points(simplex):
+    point1 = sum((s.a * s.u for s in simplex), Vector(0, 0))
+    point2 = sum((s.b * s.u for s in simplex), Vector(0, 0))
+    return point1, point2
+
+
+def epa(body1, body2, simplex, max_iterations=GJK_ITERATIONS, tolerance=GJK_TOLERANCE):
+    """expands a simplex containing the origin into the Minkowski difference's boundary, returning the depth, the
+        deepest points on each core and the normal that separates them fastest"""
+    polytope = list(simplex)
+    # Wind anticlockwise so every edge's outward normal is its direction rotated by -90 degrees
+    if (polytope[1].w - polytope[0].w) ^ (polytope[2].w - polytope[0].w) < 0:
+        polytope[1], polytope[2] = polytope[2], polytope[1]
+
+    for _ in range(max_iterations):
+        best = None
+        for i in range(len(polytope)):
+            p1, p2 = polytope[i], polytope[(i + 1) % len(polytope)]
+            edge = p2.w - p1.w
+            length = abs(edge)
+            if length <= tolerance:
+                continue
+            normal = Vector(edge.y / length, -edge.x / length)
+            distance = normal * p1.w
+            if best is None or distance < best[0]:
+                best = (distance, i, normal)
+
+        distance, i, normal = best
+        new = support(body1, body2, normal)
+        if new.w * normal - distance <= tolerance:
+            break
+        polytope.insert(i + 1, new)
+
+    # Deepest points interpolated along the closest edge at the origin's projection onto it
+    p1, p2 = polytope[i], polytope[(i + 1) % len(polytope)]
+    edge = p2.w - p1.w
+    t = min(max(-(p1.w * edge) / (edge * edge), 0), 1)
+    point1 = p1.a + (p2.a - p1.a) * t
+    point2 = p1.b + (p2.b - p1.b) * t
+    return distance, point1, point2, normal
+
+
+def convex_query(body1, body2):
+    """returns the separation (or penetration), closest points and normal of two convex bodies"""
+    radius1, radius2 = body1.shape.get_support_radius(), body2.shape.get_support_radius()
+    simplex, closest = gjk(body1, body2)
+    point1, point2 = closest_points(simplex)
+
+    if closest.x or closest.y:
+        core_distance = abs(closest)
+        normal = -closest / core_distance
+        return ConvexResult(core_distance - radius1 - radius2,
+                            point1 + normal * radius1, point2 - normal * radius2, normal)
+
+    if len(simplex) < 3:
+        # Cores only touch, there is no area for EPA to expand, so fall back to the line between the bodies
+        normal = body2.position - body1.position
+        normal = normal.normalise() if normal.x or normal.y else Vector(1, 0)
+        return ConvexResult(-radius1 - radius2, point1 + normal * radius1, point2 - normal * radius2, normal)
+
+    depth, point1, point2, normal = epa(body1, body2, simplex)
+    # EPA's normal is the direction to move the second body, so it already points from the first to the second
+    return ConvexResult(-depth - radius1 - radius2, point1 + normal * radius1, point2 - normal * radius2, normal)
+
+
+def gather_polygon_geometry(bodies):
+    """returns the world vertices and axes of polygon bodies as (N, order, 2) arrays along with each one's vertex
+        count. Shorter polygons are padded by repeating their last vertex and axis, which leaves every projection's
+        minimum and maximum unchanged"""
+    counts = np.array([body.shape.order for body in bodies], dtype=int)
+    order = int(counts.max()) if len(counts) else 0
+    vertices = np.empty((len(bodies), order, 2))
+    axes = np.empty((len(bodies), order, 2))
+    for row, body in enumerate(bodies):
+        body_vertices = body.get_world_vertex_array()
+        body_axes = body.get_world_axis_array()
+        n = len(body_vertices)
+        vertices[row, :n], vertices[row, n:] = body_vertices, body_vertices[-1]
+        axes[row, :n], axes[row, n:] = body_axes, body_axes[-1]
+    return vertices, axes, counts
+
+
+def sat_push_vectors(vertices, axes, first, second):
+    """returns the minimum push vector of every pair of rows (first[k], second[k]) of padded polygon geometry, zero
+        for pairs that are separated. The push moves the first polygon out of the second"""
+    order = vertices.shape[1]
+    pair_axes = np.concatenate((axes[first], axes[second]), axis=1)
+    projections1 = np.einsum('kad,kvd->kav', pair_axes, vertices[first])
+    projections2 = np.einsum('kad,kvd->kav', pair_axes, vertices[second])
+    min1, max1 = projections1.min(axis=2), projections1.max(axis=2)
+    min2, max2 = projections2.min(axis=2), projections2.max(axis=2)
+
+    # Along the first body's axes the push is -(min1 - max2), along the second body's it is min2 - max1, and the
+    # shortest one wins
+    depths = np.concatenate((max2[:, :order] - min1[:, :order], min2[:, order:] - max1[:, order:]), axis=1)
+    best = np.argmin(np.abs(depths), axis=1)
+    k = np.arange(len(first))
+    push_vectors = pair_axes[k, best] * depths[k, best, None] * 1.05
+
+    separated = ((max1 < min2) | (max2 < min1)).any(axis=1)
+    push_vectors[separated] = 0
+    return push_vectors
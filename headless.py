@@ -0,0 +1,73 @@
+"""Steps a World as fast as it will go with no display, pygame is never imported
+
+Run with `python headless.py`, or build a World and pass it to run() to drive batch simulations from other scripts.
+"""
+import argparse
+import random
+import sys
+import time
+from math import pi
+
+from vector import Vector
+from shapes import Collidable, SHAPES
+from world import World
+from collisions import BROADPHASES
+from constants import *
+
+BODY_SIZE = 20      # rough diameter of every body, in pixels
+
+
+def make_shapes(rand):
+    """returns the handful of shapes bodies share, building a distinct hull per body would dwarf a benchmark"""
+    r = BODY_SIZE / 2
+    polygons = []
+    for _ in range(6):
+        vertices = [Vector((rand.uniform(-r, r), rand.uniform(-r, r))) for _ in range(8)]
+        polygon = SHAPES.get_polygon(vertices)
+        polygons.append(polygon.translate(-polygon.get_barycenter()))
+    return polygons + [SHAPES.get_circle(r)]
+
+
+def make_world(count, seed=0, broadphase=None, processes=None):
+    """returns a world of count bodies scattered over the screen with random velocities"""
+    rand = random.Random(seed)
+    shapes = make_shapes(rand)
+    bodies = []
+    for i in range(count):
+        body = Collidable(shapes[i % len(shapes)], 1)
+        body.position = Vector((rand.uniform(BODY_SIZE, SCREENWIDTH - BODY_SIZE),
+                                rand.uniform(BODY_SIZE, SCREENHEIGHT - BODY_SIZE)))
+        body.orientation = rand.uniform(0, 2 * pi)
+        body.linear_velocity = Vector((rand.uniform(-2, 2), rand.uniform(-2, 2)))
+        bodies.append(body)
+    return World(bodies, broadphase, processes=processes)
+
+
+def run(world, ticks, callback=None):
+    """runs ticks fixed steps back to back, calling callback(world, tick) after each, and returns the seconds taken"""
+    start = time.perf_counter()
+    for tick in range(ticks):
+        world.tick()
+        if callback is not None:
+            callback(world, tick)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--bodies", type=int, default=200)
+    parser.add_argument("--ticks", type=int, default=600)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--broadphase", choices=sorted(BROADPHASES), default=BROADPHASE)
+    parser.add_argument("--processes", type=int, default=NARROWPHASE_PROCESSES)
+    args = parser.parse_args()
+
+    with make_world(args.bodies, args.seed, args.broadphase, args.processes) as world:
+        seconds = run(world, args.ticks)
+    print(f"{args.ticks} ticks of {args.bodies} bodies in {seconds:.2f} s, {args.ticks / seconds:.1f} ticks/s, "
+          f"{args.ticks * FIXED_TIMESTEP / seconds:.1f}x real time, "
+          f"pygame {'imported' if 'pygame' in sys.modules else 'not imported'}")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,6 +2,7 @@ import pygame
 from vector import Vector, VectorSpace
 from math import sin, cos, pi
 from random import randint as ran
+from world import FixedTimestep
 
 
 
@@ -126,15 +127,15 @@ class Camera:
 
 def draw(craft, camera, screen):
 	# Having actors draw themselves is not a good design
-	verts = [v.convert([craft.space, -camera.space,VectorSpace((400,400))]).toPoint() for v in craft.polygon]
-	verts2 = [v.convert([VectorSpace((700, 100), craft.orientation)]).toPoint() for v in craft.polygon]
+	verts = [v.transform([craft.space, -camera.space,VectorSpace((400,400))]).to_point() for v in craft.polygon]
+	verts2 = [v.transform([VectorSpace((700, 100), craft.orientation)]).to_point() for v in craft.polygon]
 	pygame.draw.polygon(screen, (255, 255, 255), verts, 2)
 	pygame.draw.polygon(screen, (255, 255, 255), verts2, 2)
 	#pygame.draw.circle(screen, (255,150,150), (400,400), 100, 2)
 
 	for i in range(100):
 		p = Vector((i*100, i*100))
-		p = p.convert([-camera.space, VectorSpace((400,400))]).toPoint()
+		p = p.transform([-camera.space, VectorSpace((400,400))]).to_point()
 		pygame.draw.circle(screen, (255,255,255), p, 30)
 
 def main():
@@ -151,6 +152,7 @@ def main():
 	print(craft.thrusters)
 
 	camera = Camera()
+	timestep = FixedTimestep()
 
 
 
@@ -159,13 +161,14 @@ def main():
 		craft.setThrusters(pygame.key.get_pressed())
 		if pygame.key.get_pressed()[pygame.K_w]:
 			camera.start_shake()
-		craft.updateBodyEuler(1)
+		# updateBodyEuler works in ticks, one per fixed step
+		for _ in range(timestep.advance(clock.tick(60) / 1000)):
+			craft.updateBodyEuler(1)
 		camera.track(craft.position)
 		camera.shake(0.1)
 		draw(craft, camera, screen)
 		pygame.display.update()
 		screen.fill(BGCOLOUR)
-		clock.tick(60)
 
 		for event in pygame.event.get():
 			if event.type == pygame.QUIT:
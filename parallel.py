@@ -0,0 +1,185 @@
+import numpy as np
+from multiprocessing import Pool
+from multiprocessing.shared_memory import SharedMemory
+from vector import Vector
+from convex import gather_polygon_geometry
+from contacts import Manifold, Contact, collide_polygons
+from constants import *
+
+# Polygon narrowphase spread over a pool of worker processes. The pushes separating overlapping pairs are applied
+# in pair order by the CollisionHandler first, then the world geometry of every polygon in a pair is written once
+# into a shared memory block. Workers only receive the pair indices of their batch and send back compact contacts,
+# which are turned back into manifolds in pair order so the serial solve sees exactly what the single process
+# narrowphase would.
+
+# Per body row of the shared block after its vertices and axes: x, y, vertex count, high priority
+ROW_EXTRA = 4
+
+_attached = {}      # worker side, shared memory name -> SharedMemory, so each block is attached once per worker
+
+
+class ShapeView:
+    """Stands in for a polygon shape inside a worker, where only the world geometry is known"""
+
+    __slots__ = ('order',)
+
+    def __init__(self, order):
+        self.order = order
+
+    def get_support_radius(self):
+        return 0
+
+
+class GeometryView:
+    """Read-only polygon body rebuilt from a row of shared geometry, offering what collide_polygons asks of a
+        Collidable"""
+
+    __slots__ = ('position', 'shape', 'vertices', 'axes', 'high_priority')
+
+    def __init__(self, vertices, axes, position, high_priority):
+        self.vertices = [Vector(x, y) for x, y in vertices]
+        self.axes = [Vector(x, y) for x, y in axes]
+        self.position = Vector(*position)
+        self.shape = ShapeView(len(self.vertices))
+        self.high_priority = high_priority
+
+    def get_world_vertices(self):
+        return self.vertices
+
+    def get_world_axes(self):
+        return self.axes
+
+    def support(self, direction):
+        return max(self.vertices, key=lambda vertex: vertex * direction)
+
+    def is_high_priority(self):
+        return self.high_priority
+
+
+def get_row_size(order):
+    return 4 * order + ROW_EXTRA
+
+
+def pack_geometry(bodies, out=None):
+    """writes the world geometry of polygon bodies into rows of a flat float array, returning it with the padded
+        vertex count"""
+    vertices, axes, counts = gather_polygon_geometry(bodies)
+    n, order = len(bodies), vertices.shape[1]
+    rows = np.empty((n, get_row_size(order))) if out is None else out[:n * get_row_size(order)].reshape(n, -1)
+    rows[:, :2 * order] = vertices.reshape(n, -1)
+    rows[:, 2 * order:4 * order] = axes.reshape(n, -1)
+    rows[:, 4 * order:4 * order + 2] = [tuple(body.position) for body in bodies]
+    rows[:, 4 * order + 2] = counts
+    rows[:, 4 * order + 3] = [body.is_high_priority() for body in bodies]
+    return rows, order
+
+
+def collide_batch(rows, order, first, second):
+    """returns the compact manifold of each of a batch of polygon pairs, given as row indices, as None or
+        (normal, [(x, y, separation, feature), ...])"""
+    n = len(rows)
+    vertices = rows[:, :2 * order].reshape(n, order, 2)
+    axes = rows[:, 2 * order:4 * order].reshape(n, order, 2)
+
+    results = []
+    for i, j in zip(first.tolist(), second.tolist()):
+        views = []
+        for row in (i, j):
+            count = int(rows[row, 4 * order + 2])
+            views.append(GeometryView(vertices[row, :count].tolist(), axes[row, :count].tolist(),
+                                      rows[row, 4 * order:4 * order + 2].tolist(), bool(rows[row, 4 * order + 3])))
+        manifold = collide_polygons(*views)
+        if manifold is None:
+            results.append(None)
+        else:
+            results.append((tuple(manifold.normal), [(contact.point.x, contact.point.y, contact.separation,
+                                                      contact.feature) for contact in manifold.contacts]))
+    return results
+
+
+def collide_shared(name, shape, order, first, second):
+    """worker entry point, runs collide_batch on the geometry held in the named shared memory block"""
+    memory = _attached.get(name)
+    if memory is None:
+        for stale in _attached.values():
+            stale.close()
+        _attached.clear()
+        memory = _attached[name] = SharedMemory(name=name)
+    rows = np.ndarray(shape, dtype=np.float64, buffer=memory.buf)
+    return collide_batch(rows, order, first, second)
+
+
+class ParallelNarrowphase:
+    """Finds the contact manifolds of polygon pairs on a pool of processes, pair lists shorter
+        than one batch are handled in this process since shipping them would cost more than it saves"""
+
+    def __init__(self, processes=None, batch_size=None):
+        self.processes = NARROWPHASE_PROCESSES if processes is None else processes
+        self.batch_size = NARROWPHASE_BATCH if batch_size is None else batch_size
+        self.pool = None
+        self.memory = None
+
+    def get_pool(self):
+        if self.pool is None:
+            self.pool = Pool(self.processes)
+        return self.pool
+
+    def get_buffer(self, size):
+        """returns a float array view of the shared memory block, replacing the block with one twice as large if it
+            can't hold size floats"""
+        nbytes = size * 8
+        if self.memory is None or self.memory.size < nbytes:
+            capacity = max(nbytes, 2 * self.memory.size if self.memory is not None else 0)
+            self.release_memory()
+            self.memory = SharedMemory(create=True, size=capacity)
+        return np.ndarray(self.memory.size // 8, dtype=np.float64, buffer=self.memory.buf)
+
+    def collide(self, pairs):
+        """returns the manifold of each pair of polygon bodies, or None where they aren't touching. Results are in
+            the order of pairs however the work was split"""
+        if not pairs:
+            return []
+
+        rows = {}
+        for pair in pairs:
+            for body in pair:
+                rows.setdefault(body, len(rows))
+        bodies = list(rows)
+        first = np.array([rows[body1] for body1, _ in pairs])
+        second = np.array([rows[body2] for _, body2 in pairs])
+
+        if self.processes < 2 or len(pairs) <= self.batch_size:
+            geometry, order = pack_geometry(bodies)
+            batches = [collide_batch(geometry, order, first, second)]
+        else:
+            order = max(body.shape.order for body in bodies)
+            geometry, order = pack_geometry(bodies, self.get_buffer(len(bodies) * get_row_size(order)))
+            bounds = range(0, len(pairs), self.batch_size)
+            batches = self.get_pool().starmap(collide_shared, [
+                (self.memory.name, geometry.shape, order, first[i:i + self.batch_size], second[i:i + self.batch_size])
+                for i in bounds])
+
+        manifolds = []
+        for (body1, body2), result in zip(pairs, (result for batch in batches for result in batch)):
+            if result is None:
+                manifolds.append(None)
+                continue
+            normal, contacts = result
+            manifolds.append(Manifold(body1, body2, Vector(*normal),
+                                      [Contact(Vector(x, y), separation, feature)
+                                       for x, y, separation, feature in contacts]))
+        return manifolds
+
+    def release_memory(self):
+        if self.memory is not None:
+            self.memory.close()
+            self.memory.unlink()
+            self.memory = None
+
+    def close(self):
+        """shuts down the worker processes and frees the shared memory"""
+        if self.pool is not None:
+            self.pool.close()
+            self.pool.join()
+            self.pool = None
+        self.release_memory()
@@ -0,0 +1,193 @@
+import numpy as np
+from math import pi
+from collisions import expand_ranges
+from world import FixedTimestep
+from constants import *
+
+# Cells checked against each cell, only half the neighbourhood so every pair of cells is visited once
+NEIGHBOUR_OFFSETS = ((0, 0), (1, -1), (1, 0), (1, 1), (0, 1))
+
+
+class ParticleSystem:
+    """Circles with no orientation held entirely in NumPy arrays, so thousands collide elastically per step without
+        a Python object per particle. Particles are referred to by index, removing one moves the last into its slot"""
+
+    ARRAYS = ('positions', 'velocities', 'radii', 'inverse_masses')
+
+    def __init__(self, capacity=1024, bounds=None, cell_size=None, timestep=None, max_substeps=None):
+        self.count = 0
+        self.bounds = (0, 0, SCREENWIDTH, SCREENHEIGHT) if bounds is None else bounds
+        self.cell_size = cell_size      # defaults to the largest diameter, see get_cell_size
+        self.clock = FixedTimestep(timestep, max_substeps)
+
+        self.positions = np.zeros((capacity, 2))
+        self.velocities = np.zeros((capacity, 2))   # pixels per tick, as in World
+        self.radii = np.zeros(capacity)
+        self.inverse_masses = np.zeros(capacity)
+
+    def __len__(self):
+        return self.count
+
+    def grow(self, minimum):
+        capacity = max(2 * len(self.positions), minimum)
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            grown = np.zeros((capacity,) + array.shape[1:], dtype=array.dtype)
+            grown[:self.count] = array[:self.count]
+            setattr(self, name, grown)
+
+    def add(self, position, velocity=(0, 0), radius=1, mass=None):
+        """adds one particle, returning its index"""
+        return self.extend([position], [velocity], radius, None if mass is None else [mass])[0]
+
+    def extend(self, positions, velocities=None, radii=1, masses=None):
+        """adds many particles at once from (N, 2) positions and velocities, radii and masses may be scalars or (N,)
+            arrays, masses default to the circles' areas. Returns the new particles' indices"""
+        positions = np.asarray(positions, dtype=float).reshape(-1, 2)
+        n = len(positions)
+        radii = np.broadcast_to(np.asarray(radii, dtype=float), (n,))
+        masses = pi * radii * radii if masses is None else np.broadcast_to(np.asarray(masses, dtype=float), (n,))
+        if self.count + n > len(self.positions):
+            self.grow(self.count + n)
+
+        new = slice(self.count, self.count + n)
+        self.positions[new] = positions
+        self.velocities[new] = 0 if velocities is None else np.asarray(velocities, dtype=float).reshape(-1, 2)
+        self.radii[new] = radii
+        self.inverse_masses[new] = 1 / masses
+        self.count += n
+        return np.arange(new.start, new.stop)
+
+    def remove(self, index):
+        self.count -= 1
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            array[index] = array[self.count]
+
+    def get_positions(self):
+        return self.positions[:self.count]
+
+    def get_velocities(self):
+        return self.velocities[:self.count]
+
+    def get_radii(self):
+        return self.radii[:self.count]
+
+    def get_cell_size(self):
+        """returns the grid's cell size, overlapping circles are then never more than one cell apart"""
+        if self.cell_size is not None:
+            return self.cell_size
+        return max(2 * float(self.radii[:self.count].max()), 1.0)
+
+    def find_pairs(self):
+        """returns every pair of overlapping circles as a (K, 2) array of indices, from a grid of sorted cell keys"""
+        n = self.count
+        positions, radii = self.positions[:n], self.radii[:n]
+        if n < 2:
+            return np.zeros((0, 2), dtype=int)
+
+        # Cell keys are exact rather than hashed, rows are padded by one so stepping a cell up or down never wraps
+        cells = np.floor(positions / self.get_cell_size()).astype(np.int64)
+        cells -= cells.min(axis=0) - (0, 1)
+        stride = int(cells[:, 1].max()) + 2
+        keys = cells[:, 0] * stride + cells[:, 1]
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+
+        first, second = [], []
+        for dx, dy in NEIGHBOUR_OFFSETS:
+            targets = keys + dx * stride + dy
+            end = np.searchsorted(keys, targets, side='right')
+            if dx == dy == 0:
+                # Within a cell only pair each particle with those sorted after it
+                begin = np.arange(1, n + 1)
+            else:
+                begin = np.searchsorted(keys, targets, side='left')
+            owners, partners = expand_ranges(begin, end - begin)
+            first.append(order[owners])
+            second.append(order[partners])
+        a, b = np.concatenate(first), np.concatenate(second)
+
+        offsets = positions[a] - positions[b]
+        reach = radii[a] + radii[b]
+        keep = np.einsum('kd,kd->k', offsets, offsets) < reach * reach
+        return np.column_stack((a[keep], b[keep]))
+
+    def collide(self, pairs=None):
+        """applies the elastic impulse to every approaching overlapping pair at once"""
+        if pairs is None:
+            pairs = self.find_pairs()
+        a, b = pairs[:, 0], pairs[:, 1]
+        normals = self.positions[a] - self.positions[b]
+        distances = np.sqrt(np.einsum('kd,kd->k', normals, normals))
+        relative_velocities = np.einsum('kd,kd->k', self.velocities[a] - self.velocities[b], normals)
+
+        # Pairs already separating keep their velocities, as do exactly coincident centres which have no normal
+        approaching = (relative_velocities < 0) & (distances > 0)
+        a, b = a[approaching], b[approaching]
+        normals = normals[approaching] / distances[approaching, None]
+        relative_velocities = relative_velocities[approaching] / distances[approaching]
+
+        impulses = -(1 + COEFFICIENT_RESTITUTION) * relative_velocities / \
+            (self.inverse_masses[a] + self.inverse_masses[b])
+        impulses = normals * impulses[:, None]
+        np.add.at(self.velocities, a, impulses * self.inverse_masses[a, None])
+        np.add.at(self.velocities, b, -impulses * self.inverse_masses[b, None])
+
+    def reflect(self):
+        """turns back every particle that has crossed one of the walls"""
+        n = self.count
+        positions, velocities, radii = self.positions[:n], self.velocities[:n], self.radii[:n, None]
+        speeds = np.abs(velocities)
+        minimum, maximum = np.array(self.bounds[:2]), np.array(self.bounds[2:])
+        velocities[:] = np.where(positions - radii < minimum, speeds,
+                                 np.where(positions + radii > maximum, -speeds, velocities))
+
+    def integrate(self, dt=1):
+        n = self.count
+        self.positions[:n] += self.velocities[:n] * dt
+
+    def tick(self):
+        """runs one fixed step, moving every particle then resolving collisions and walls"""
+        self.integrate(self.clock.timestep * TICKS_PER_SECOND)
+        self.collide()
+        self.reflect()
+
+    def step(self, dt):
+        """advances the simulation by dt seconds of frame time in fixed steps, returning how many were run"""
+        steps = self.clock.advance(dt)
+        for _ in range(steps):
+            self.tick()
+        return steps
+
+
+def main():
+    import pygame
+
+    pygame.init()
+    screen = pygame.display.set_mode((SCREENWIDTH, SCREENHEIGHT))
+    clock = pygame.time.Clock()
+
+    rng = np.random.default_rng(0)
+    particles = ParticleSystem()
+    count = 10000
+    particles.extend(rng.uniform(0, (SCREENWIDTH, SCREENHEIGHT), (count, 2)), rng.uniform(-1, 1, (count, 2)),
+                     rng.uniform(1, 3, count))
+
+    running = True
+    while running:
+        screen.fill(BACKGROUND_COLOUR)
+        for (x, y), radius in zip(particles.get_positions().tolist(), particles.get_radii().tolist()):
+            pygame.draw.circle(screen, FOREGROUND_COLOUR, (x, y), radius, 1)
+        pygame.display.update()
+        particles.step(clock.tick(60) / 1000)
+
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                running = False
+        pygame.display.set_caption(str(round(clock.get_fps(), 1)))
+    pygame.quit()
+
+
+if __name__ == "__main__":
+    main()
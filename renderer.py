@@ -0,0 +1,186 @@
+import numpy as np
+import pygame
+from vector import VectorSpace, compose_spaces
+from shapes import Polygon
+from constants import *
+
+# Draws a whole World per frame from its arrays. Every polygon vertex is taken to screen space in one array
+# operation, body pose and camera composed into a single rotation per body, so nothing is transformed per Vector.
+
+DIRTY_MARGIN = 3     # pixels added around dirty rects for line widths and rounding
+DIRTY_LIMIT = 0.5    # share of the screen the dirty rects can cover before a full redraw is cheaper
+
+
+def merge_rects(rects):
+    """returns the rects with every overlapping group replaced by its union, so no area is cleared or sent twice"""
+    merged = []
+    for rect in rects:
+        rect = rect.copy()
+        index = rect.collidelist(merged)
+        while index != -1:
+            rect.union_ip(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
+
+
+class Renderer:
+    """Draws the bodies of a World at their interpolated poses, as seen through camera"""
+
+    def __init__(self, screen, camera=None, draw_velocities=True, draw_boxes=None, dirty_rects=False):
+        self.screen = screen
+        self.camera = VectorSpace() if camera is None else camera
+        self.draw_velocities = draw_velocities
+        self.draw_boxes = DRAW_BOXES if draw_boxes is None else draw_boxes
+
+        # With dirty rects only the areas bodies left or entered since the last frame are cleared and redrawn
+        self.dirty_rects = dirty_rects
+        self.previous_rects = self.previous_states = None
+        self._camera_key = None
+
+        # Local geometry of the world's bodies, rebuilt only when the bodies or their shapes change
+        self._layout_key = None
+        self.polygon_indices = self.circle_indices = None
+        self.local_vertices = self.owners = self.starts = None
+        self.local_barycenters = self.local_centres = self.radii = None
+
+    def update_layout(self, bodies):
+        """rebuilds the cached local geometry if the bodies have changed, returning whether they had"""
+        key = tuple((id(body.shape), id(getattr(body.shape, 'vertices', None))) for body in bodies)
+        if key == self._layout_key:
+            return False
+        self._layout_key = key
+
+        polygons = [i for i, body in enumerate(bodies) if isinstance(body.shape, Polygon)]
+        circles = [i for i, body in enumerate(bodies) if not isinstance(body.shape, Polygon)]
+        counts = [bodies[i].shape.order for i in polygons]
+        self.polygon_indices = np.array(polygons, dtype=int)
+        self.circle_indices = np.array(circles, dtype=int)
+        self.starts = np.concatenate(([0], np.cumsum(counts)[:-1])).astype(int) if counts else np.zeros(0, dtype=int)
+        self.owners = np.repeat(self.polygon_indices, counts)
+        self.local_vertices = np.array([tuple(vertex) for i in polygons for vertex in bodies[i].shape.vertices],
+                                       dtype=float).reshape(-1, 2)
+        self.local_barycenters = np.array([tuple(bodies[i].shape.get_barycenter()) for i in polygons],
+                                          dtype=float).reshape(-1, 2)
+        self.local_centres = np.array([tuple(bodies[i].shape.get_centroid()) for i in circles],
+                                      dtype=float).reshape(-1, 2)
+        self.radii = np.array([bodies[i].shape.radius for i in circles], dtype=float)
+        return True
+
+    def get_screen_poses(self, world):
+        """returns every body's rotation matrix and translation into screen space, camera included, as (N, 2, 2)
+            and (N, 2) arrays"""
+        camera = compose_spaces([self.camera])
+        orientations = world.get_render_orientations()
+        c, s = np.cos(orientations), np.sin(orientations)
+        rotations = np.empty((len(orientations), 2, 2))
+        rotations[:, 0, 0], rotations[:, 0, 1], rotations[:, 1, 0], rotations[:, 1, 1] = c, -s, s, c
+        rotations = camera.linear() @ rotations
+        translations = world.get_render_positions() @ camera.linear().T + (camera.tx, camera.ty)
+        return rotations, translations
+
+    @staticmethod
+    def apply_poses(rotations, translations, owners, points):
+        return np.einsum('kij,kj->ki', rotations[owners], points) + translations[owners]
+
+    def get_frame(self, world):
+        """returns this frame's screen geometry: polygon vertices, barycenters and velocity tips, circle centres,
+            and every body's screen rect as an (N, 4) array of x1, y1, x2, y2 in body order"""
+        rotations, translations = self.get_screen_poses(world)
+        vertices = self.apply_poses(rotations, translations, self.owners, self.local_vertices)
+        barycenters = self.apply_poses(rotations, translations, self.polygon_indices, self.local_barycenters)
+        centres = self.apply_poses(rotations, translations, self.circle_indices, self.local_centres)
+
+        rects = np.empty((len(world.bodies), 4))
+        tips = barycenters
+        if len(vertices):
+            rects[self.polygon_indices, :2] = np.minimum.reduceat(vertices, self.starts)
+            rects[self.polygon_indices, 2:] = np.maximum.reduceat(vertices, self.starts)
+            if self.draw_velocities:
+                # Velocities are directions, so only the camera's rotation applies to them
+                camera = compose_spaces([self.camera]).linear()
+                tips = barycenters + world.linear_velocities[self.polygon_indices] @ camera.T * 10
+                rects[self.polygon_indices, :2] = np.minimum(rects[self.polygon_indices, :2], tips)
+                rects[self.polygon_indices, 2:] = np.maximum(rects[self.polygon_indices, 2:], tips)
+        if len(centres):
+            # Only circles' centres move, the camera is rigid so radii stay as they are
+            rects[self.circle_indices, :2] = centres - self.radii[:, None]
+            rects[self.circle_indices, 2:] = centres + self.radii[:, None]
+        return vertices, barycenters, tips, centres, rects
+
+    @staticmethod
+    def get_states(world):
+        """returns what decides how each body looks, its render pose and, for the velocity line, its velocity"""
+        return np.column_stack((world.get_render_positions(), world.get_render_orientations(),
+                                world.linear_velocities[:len(world.bodies)]))
+
+    def get_dirty_rects(self, rects, states):
+        """returns the screen areas to clear and redraw, covering the previous and current rects of every body that
+            changed, merged where they overlap. Returns None if they cover more than DIRTY_LIMIT of the screen"""
+        moved = (states != self.previous_states).any(axis=1)
+        changed = np.concatenate((self.previous_rects[moved], rects[moved]))
+        # Padded to cover line widths and rounding
+        changed = np.column_stack((np.floor(changed[:, :2]) - DIRTY_MARGIN, np.ceil(changed[:, 2:]) + DIRTY_MARGIN))
+        screen = self.screen.get_rect()
+        dirty = [pygame.Rect(x1, y1, x2 - x1, y2 - y1).clip(screen) for x1, y1, x2, y2 in changed.astype(int).tolist()]
+        dirty = merge_rects([rect for rect in dirty if rect.width and rect.height])
+        if sum(rect.width * rect.height for rect in dirty) > DIRTY_LIMIT * screen.width * screen.height:
+            return None
+        return dirty
+
+    def draw(self, world):
+        """draws the world and returns the areas of the screen that changed, to be passed to pygame.display.update.
+            Without dirty rects, when the camera or the set of bodies changes, or when most of the screen is dirty,
+            that is the whole screen"""
+        layout_changed = self.update_layout(world.bodies)
+        vertices, barycenters, tips, centres, rects = self.get_frame(world)
+        camera_key = tuple(compose_spaces([self.camera]).as_array().ravel().tolist())
+        width, height = self.screen.get_size()
+
+        states = self.get_states(world)
+
+        dirty = None
+        if self.dirty_rects and not layout_changed and camera_key == self._camera_key:
+            dirty = self.get_dirty_rects(rects, states)
+        if dirty is not None:
+            changed = np.array([(rect.left, rect.top, rect.right, rect.bottom) for rect in dirty],
+                               dtype=float).reshape(-1, 4)
+            for rect in dirty:
+                self.screen.fill(BACKGROUND_COLOUR, rect)
+            # Everything reaching into a cleared area is drawn again, whether it moved or not. Lines stick out of
+            # the rects by up to their width, hence the margin. Where outlines cross outside the cleared areas the
+            # redrawn one ends up on top, otherwise the result is the same as a full redraw
+            redraw = ((rects[:, None, 2:] + DIRTY_MARGIN >= changed[None, :, :2]) &
+                      (rects[:, None, :2] - DIRTY_MARGIN <= changed[None, :, 2:])).all(axis=2).any(axis=1)
+        else:
+            self.screen.fill(BACKGROUND_COLOUR)
+            dirty = [self.screen.get_rect()]
+            redraw = np.ones(len(rects), dtype=bool)
+        redraw &= (rects[:, 2] >= 0) & (rects[:, 0] <= width) & (rects[:, 3] >= 0) & (rects[:, 1] <= height)
+        self.previous_rects, self.previous_states = rects, states
+        self._camera_key = camera_key
+
+        if len(vertices):
+            visible = redraw[self.polygon_indices]
+            points = np.rint(vertices).astype(int).tolist()
+            ends = np.append(self.starts[1:], len(points))
+            for start, end in zip(self.starts[visible].tolist(), ends[visible].tolist()):
+                pygame.draw.polygon(self.screen, FOREGROUND_COLOUR, points[start:end], 1)
+
+            starts = np.rint(barycenters[visible]).astype(int).tolist()
+            for centre in starts:
+                pygame.draw.circle(self.screen, FOREGROUND_COLOUR, centre, 2)
+            if self.draw_velocities:
+                for start, end in zip(starts, np.rint(tips[visible]).astype(int).tolist()):
+                    pygame.draw.line(self.screen, (0, 255, 0), start, end, 2)
+
+        if len(centres):
+            visible = redraw[self.circle_indices]
+            for (x, y), radius in zip(np.rint(centres[visible]).astype(int).tolist(), self.radii[visible].tolist()):
+                pygame.draw.circle(self.screen, FOREGROUND_COLOUR, (x, y), radius, 1)
+
+        if self.draw_boxes:
+            boxes = np.rint(rects[redraw]).astype(int).tolist()
+            for x1, y1, x2, y2 in boxes:
+                pygame.draw.rect(self.screen, BOX_COLOUR, (x1, y1, x2 - x1, y2 - y1), 1)
+        return dirty
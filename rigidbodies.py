@@ -1,12 +1,13 @@
 from math import pi, sqrt
 from vector import Vector, VectorSpace
-from collisions import SweepPrune
-import pygame
-from pygame import gfxdraw
+from collisions import make_broadphase
+from world import FixedTimestep
+from trails import Trail
+from constants import FIXED_TIMESTEP
 
 from random import randint
 
-pygame.init()
+# pygame is only imported to draw, so the simulation itself runs without it (see headless.py)
 
 # todo use numpy or opengl to transform the screen, 74% of the draw function is spent transforming
 #  (transforming per point is inefficient)
@@ -15,11 +16,11 @@ pygame.init()
 
 
 class Circle:
-    def __init__(self, screen, radius, position, spaces=None, colour=None):
+    def __init__(self, screen, radius, position, spaces=None, colour=None, trail_length=None, trail_decimation=None):
         if spaces is None:
             spaces = []
         self.theta = 0
-        self.trail = []
+        self.trail = Trail(trail_length, trail_decimation)
         self.spaces = spaces
         self.screen = screen
         self.radius = radius
@@ -29,15 +30,15 @@ class Circle:
         self.colour = (0, 0, 0) if colour is None else colour
 
     def draw(self):
+        from pygame import gfxdraw
+
         position = self.position.transform(self.spaces)
-        pygame.gfxdraw.circle(self.screen, int(position[0]), int(position[1]), self.radius, self.colour)
+        gfxdraw.circle(self.screen, int(position[0]), int(position[1]), self.radius, self.colour)
 
-    def update(self):
-        self.trail.append(self.position)
-        if len(self.trail) > 50:
-            self.trail.pop(0)
+    def update(self, dt=FIXED_TIMESTEP):
+        self.trail.record(self.position.x, self.position.y)
 
-        self.position += self.velocity / 60
+        self.position += self.velocity * dt
 
         if self.position[0] - self.radius < 0:
             self.velocity.x = abs(self.velocity.x)
@@ -56,6 +57,10 @@ class Circle:
         maxY = self.position[1] + self.radius
         return [minX, minY, maxX, maxY]
 
+    def is_sleeping(self):
+        # Broadphases skip updating sleeping bodies, these circles never sleep
+        return False
+
     def collide(self, other):
         pass
         # print("colliding")
@@ -65,8 +70,7 @@ class Circle:
         #                 position2.getInt(), 2)
 
     def draw_trail(self):
-        for i in range(len(self.trail) - 2):
-            pygame.draw.line(self.screen, (0, 0, 200), self.trail[i], self.trail[i + 1], 1)
+        self.trail.draw(self.screen, self.spaces)
 
 
 def handle_collisions(sweep):
@@ -91,6 +95,7 @@ def handle_collisions(sweep):
 
 def main():
     from time import time
+    import pygame
 
     pygame.init()
     pygame.font.init()
@@ -113,9 +118,10 @@ def main():
         circle.velocity = Vector((randint(-100, 100), randint(-100, 100)))
         circles.append(circle)
 
-    sp = SweepPrune(circles)
+    sp = make_broadphase(circles)
 
     clock = pygame.time.Clock()
+    timestep = FixedTimestep()
     circles[0].velocity = Vector([2, 0])
     circles[1].velocity = Vector([1, 0])
 
@@ -139,8 +145,9 @@ def main():
             if event.type == pygame.MOUSEBUTTONDOWN:
                 if event.button == 1:
                     mpos = pygame.mouse.get_pos()
-                    circles.append(Circle(screen, 10, Vector(mpos), [camera]))
-                    sp = SweepPrune(circles)
+                    circle = Circle(screen, 10, Vector(mpos), [camera])
+                    circles.append(circle)
+                    sp.add(circle)
             elif event.type == pygame.KEYDOWN:
                 if event.key == pygame.K_a:
                     camera.translate(Vector((-10, 0)))
@@ -149,7 +156,6 @@ def main():
 
         for circle in circles:
             circle.draw()
-            circle.update()
             circle.draw_trail()
         circles[0].draw_trail()
         circles[1].draw_trail()
@@ -165,9 +171,11 @@ def main():
         # screen.blit(text, (50, 50))
         pygame.display.update()
         screen.fill((255, 255, 255))
-        clock.tick()
-        sp.update_values()
-        handle_collisions(sp)
+        for _ in range(timestep.advance(clock.tick() / 1000)):
+            for circle in circles:
+                circle.update(timestep.timestep)
+            sp.update_values()
+            handle_collisions(sp)
         # print(sp.overlapsX)
 
     print(f"avg fps: {sum(fpss)/len(fpss)}")
@@ -1,11 +1,19 @@
-from vector import Vector, VectorSpace
+from vector import Vector, VectorArray, VectorSpace, compose_spaces
 from math import pi
 from abc import ABCMeta, abstractmethod
+from weakref import WeakValueDictionary
+from itertools import count
+import numpy as np
 from constants import *
 
 
 class Shape(metaclass=ABCMeta):
-    """Abstract base class representing all shapes in the sim"""
+    """Abstract base class representing all shapes in the sim. Shapes are shared between bodies (see ShapeRegistry),
+        so nothing changes one once it is built"""
+
+    def get_unit_inertia(self):
+        """returns the moment of inertia of the shape at a density of 1"""
+        return self.unit_inertia
 
     @abstractmethod
     def get_area(self):
@@ -19,7 +27,13 @@ class Shape(metaclass=ABCMeta):
 
     @abstractmethod
     def contains_point(self, point):
-        """checks if the shape contains a point"""
+        """checks if the shape contains a point, points on its edge count as inside"""
+        return NotImplementedError
+
+    @abstractmethod
+    def contains_points(self, points):
+        """returns which of an (N, 2) array of points the shape contains, as an (N,) bool array, agreeing with
+            contains_point"""
         return NotImplementedError
 
     @abstractmethod
@@ -42,6 +56,17 @@ class Shape(metaclass=ABCMeta):
         """TBA"""
         return NotImplementedError
 
+    @abstractmethod
+    def support(self, direction):
+        """returns the point of the shape's core furthest along direction, the shape itself is its core grown by
+            the support radius"""
+        return NotImplementedError
+
+    @abstractmethod
+    def get_support_radius(self):
+        """returns how far the shape extends beyond its core in every direction"""
+        return NotImplementedError
+
 
 class Circle(Shape):
     def __init__(self, radius):
@@ -49,6 +74,7 @@ class Circle(Shape):
         self.radius = radius
         self.area = pi * radius ** 2
         self.centroid = self.barycenter = Vector()
+        self.unit_inertia = self.area * radius ** 2 / 2
 
     def get_area(self):
         return self.area
@@ -63,23 +89,44 @@ class Circle(Shape):
         return (self.centroid - Vector(point)).normalise()
 
     def get_bounding_rect(self, space):
-        return [-self.radius, -self.radius, self.radius, self.radius]
+        # Padded by the contact tolerance like polygon rects, so circles within it still reach the narrowphase
+        x, y = space.position.x, space.position.y
+        r = self.radius + COLLISION_TOLERANCE
+        return [x - r, y - r, x + r, y + r]
+
+    def get_bounding_radius(self):
+        return self.radius
 
     def get_axis(self):
         return Vector((1, 0))
 
     def contains_point(self, point):
-        return abs(self.centroid - Vector(point)) < self.radius
+        return abs(self.centroid - Vector(point)) <= self.radius + POINT_TOLERANCE
 
-    def project(self, axis):
-        return [-self.radius, self.radius]
+    def contains_points(self, points):
+        offsets = np.asarray(points, dtype=float).reshape(-1, 2) - (self.centroid.x, self.centroid.y)
+        return np.einsum('kd,kd->k', offsets, offsets) <= (self.radius + POINT_TOLERANCE) ** 2
+
+    def project(self, axis, space=None):
+        """returns the bounds of the circle's shadow on an axis, in world space if the body's space is given"""
+        centre = self.centroid if space is None else self.centroid.transform([space])
+        projected_centre = axis * centre
+        return [projected_centre - self.radius, projected_centre + self.radius]
+
+    def support(self, direction):
+        # The core of a circle is its centre, GJK then stays exact instead of converging on a curve
+        return self.centroid
+
+    def get_support_radius(self):
+        return self.radius
 
 
 class Polygon(Shape):
-    def __init__(self, vertices: list[Vector]):
-        """Takes a collection of points and initialises a convex polygon"""
+    def __init__(self, vertices: list[Vector], convex=False):
+        """Takes a collection of points and initialises a convex polygon, convex vertices that are already in
+            anticlockwise order are used as they are"""
         self.vertices = vertices
-        self.vertices = self.make_convex()
+        self.vertices = tuple(vertices) if convex else tuple(self.make_convex())
         self.order = len(self.vertices)
 
         self.area = self.calc_area()
@@ -88,38 +135,30 @@ class Polygon(Shape):
         self.barycenter = self.calc_barycenter()
         self.bounding_radius = self.calc_bounding_radius()
         self.axis = self.calc_axis()
+        self.unit_inertia = self.area * self.bounding_radius ** 2 / 2
+        self.half_planes = self.calc_half_planes()
+        self.plane_normals = np.array([(nx, ny) for nx, ny, _ in self.half_planes]).reshape(-1, 2)
+        self.plane_offsets = np.array([offset for _, _, offset in self.half_planes])
 
     def make_convex(self):
         """Both makes polygon convex and normalises vertex list, starts on highest vertex and goes anticlockwise"""
-        vertices = self.vertices
-        convex_vertices = list()
-
-        next_vertex = max(vertices)
-
-        i = 0
-        while True:
-            convex_vertices.append(next_vertex)
-            end_vertex = vertices[0]
-            for vertex in vertices[1:]:
-                if (convex_vertices[i] == end_vertex) or \
-                        (vertex - convex_vertices[i]) ^ (end_vertex - convex_vertices[i]) > 0:
-                    end_vertex = vertex
-
-            next_vertex = end_vertex
-            i += 1
-            if next_vertex == convex_vertices[0]:
-                break
-
-        return convex_vertices
+        points = [(vertex[0], vertex[1]) for vertex in self.vertices]
+        hull = order_convex(points)
+        if hull is None:
+            hull = convex_hull(points)
+        if len(hull) < 3:
+            raise ValueError("a polygon needs three vertices that aren't on one line")
+        return [Vector(point) for point in hull]
 
     def triangulate(self):
         """Updates """
         triangles = list()
         if self.order > 3:
             for i in range(len(self.vertices) - 2):
+                # A fan of a convex anticlockwise polygon is already convex and anticlockwise
                 triangles.append(Polygon([self.vertices[0],
                                           self.vertices[i + 1],
-                                          self.vertices[i + 2]]))
+                                          self.vertices[i + 2]], convex=True))
         else:
             triangles = [self]
 
@@ -152,23 +191,20 @@ class Polygon(Shape):
             axis.append(edge.normalise().rotate90())
         return axis
 
-    def contains_point(self, point):
-        if self.order == 3:
-            # Barycentric Technique (https://blackpawn.com/texts/pointinpoly/default.html)
-            v0 = Vector(self.vertices[1]) - Vector(self.vertices[0])
-            v1 = Vector(self.vertices[2]) - Vector(self.vertices[0])
-            v2 = Vector(point) - Vector(self.vertices[0])
-
-            u = ((v1 * v1) * (v2 * v0) - (v1 * v0) * (v2 * v1)) / ((v1 * v1) * (v0 * v0) - (v0 * v1) * (v1 * v0))
-            v = ((v0 * v0) * (v2 * v1) - (v0 * v1) * (v2 * v0)) / ((v1 * v1) * (v0 * v0) - (v0 * v1) * (v1 * v0))
-
-            return u >= 0 and v >= 0 and u + v <= 1
+    def calc_half_planes(self):
+        """returns (nx, ny, offset) for each edge, the polygon is where nx * x + ny * y >= offset for all of them"""
+        return tuple((axis.x, axis.y, axis * vertex) for axis, vertex in zip(self.axis, self.vertices))
 
-        for triangle in self.triangles:
-            if triangle.contains_point(point):
-                return True
+    def contains_point(self, point):
+        x, y = point[0], point[1]
+        for nx, ny, offset in self.half_planes:
+            if nx * x + ny * y < offset - POINT_TOLERANCE:
+                return False
+        return True
 
-        return False
+    def contains_points(self, points):
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        return (points @ self.plane_normals.T >= self.plane_offsets - POINT_TOLERANCE).all(axis=1)
 
     def calc_bounding_radius(self):
         maximum = abs(self.vertices[0] - self.barycenter)
@@ -192,8 +228,11 @@ class Polygon(Shape):
         return self.barycenter
 
     def get_bounding_rect(self, space):
-        vertices = self.get_transformed_vertices([space])
+        return self.bounding_rect_of(self.get_transformed_vertices([space]))
 
+    @staticmethod
+    def bounding_rect_of(vertices):
+        """returns the padded bounding box of vertices that have already been transformed"""
         min_x = min(vertices, key=lambda v: v.get_x()).get_x()
         min_y = min(vertices, key=lambda v: v.get_y()).get_y()
         max_x = max(vertices, key=lambda v: v.get_x()).get_x()
@@ -208,20 +247,25 @@ class Polygon(Shape):
         return [min_x - 3, min_y - 3, max_x + 4, max_y + 4]
 
     def translate(self, vector):
-        self.centroid += vector
-        self.barycenter += vector
-        self.vertices = [vertex + vector for vertex in self.vertices]
-        self.bounding_radius = self.calc_bounding_radius()
+        """returns the registered polygon with every vertex moved by vector, this one is shared and stays put"""
+        return SHAPES.get_polygon([vertex + vector for vertex in self.vertices])
 
     def get_vertices(self):
         return self.vertices
 
     def get_transformed_vertices(self, spaces):
-        return [vertex.transform(spaces) for vertex in self.vertices]
+        matrix = compose_spaces(spaces)
+        return [matrix.apply(vertex) for vertex in self.vertices]
 
     def get_axis(self):
         return self.axis
 
+    def support(self, direction):
+        return max(self.vertices, key=lambda vertex: vertex * direction)
+
+    def get_support_radius(self):
+        return 0
+
     def project(self, axis):
         """returns the upper and lower bounds of the shadow cast on a particular axis"""
         axis = axis.normalise()
@@ -236,15 +280,218 @@ class Polygon(Shape):
         return minimum, maximum
 
 
+class BodyState:
+    """A piece of a Collidable's state, stored on the body until it joins a World and in the World's arrays after.
+        Once in a World, vector attributes return copies, so `body.linear_velocity.x += 1` is lost. Assign the whole
+        vector instead, `body.linear_velocity += Vector(1, 0)` or `body.linear_velocity = Vector(x, y)`"""
+
+    def __init__(self, array, vector=False, invalidates=False):
+        self.array = array
+        self.vector = vector
+        self.invalidates = invalidates
+        self.attribute = None
+
+    def __set_name__(self, owner, name):
+        self.attribute = '_' + name
+
+    def __get__(self, body, owner=None):
+        if body is None:
+            return self
+        if body.world is None:
+            return getattr(body, self.attribute)
+        value = getattr(body.world, self.array)[body.index]
+        return Vector(*value.tolist()) if self.vector else value.item()
+
+    def __set__(self, body, value):
+        if body.world is None:
+            setattr(body, self.attribute, value)
+        elif self.vector:
+            getattr(body.world, self.array)[body.index] = (value.x, value.y)
+        else:
+            getattr(body.world, self.array)[body.index] = value
+        if self.invalidates:
+            # Also reached by augmented assignment, so `body.position += v` invalidates the cache
+            body.revision += 1
+            # A sleeping body's broadphase entry is left alone, so moving one has to wake it
+            if body.world is not None and body.world.sleeping[body.index]:
+                body.world.wake(body)
+
+
+def cross(o, a, b):
+    return (a[0] - o[0]) * (b[1] - o[1]) - (a[1] - o[1]) * (b[0] - o[0])
+
+
+def start_highest(hull):
+    """rotates an anticlockwise hull to start on its highest vertex, the rightmost of those level with it"""
+    start = max(range(len(hull)), key=lambda i: (hull[i][1], hull[i][0]))
+    return hull[start:] + hull[:start]
+
+
+def order_convex(points):
+    """returns (x, y) points rotated to start on the highest if they already make a strictly convex anticlockwise
+        polygon, or None if they don't"""
+    n = len(points)
+    if n < 3:
+        return None
+    directions = []
+    for i in range(n):
+        if cross(points[i - 2], points[i - 1], points[i]) <= 0:
+            return None
+        dx = points[i][0] - points[i - 1][0]
+        if dx:
+            directions.append(dx > 0)
+    # Turning left at every vertex is not enough, a star does too, but only a simple polygon reverses its direction
+    # along x just twice
+    if sum(directions[i - 1] != directions[i] for i in range(len(directions))) > 2:
+        return None
+    return start_highest(points)
+
+
+def convex_hull(points):
+    """returns the convex hull of (x, y) points, anticlockwise from the highest, by Andrew's monotone chain.
+        Duplicate points and points along an edge are left out"""
+    points = sorted(set(points))
+    if len(points) < 3:
+        return points
+
+    def half_hull(points):
+        chain = []
+        for point in points:
+            while len(chain) >= 2 and cross(chain[-2], chain[-1], point) <= 0:
+                chain.pop()
+            chain.append(point)
+        return chain[:-1]
+
+    return start_highest(half_hull(points) + half_hull(reversed(points)))
+
+
+def half_hulls(points):
+    """monotone chain over every row of an (M, N, 2) array of sorted points at once, returning the chains and
+        their lengths"""
+    m, n, _ = points.shape
+    rows = np.arange(m)
+    chains = np.empty_like(points)
+    sizes = np.zeros(m, dtype=int)
+    for k in range(n):
+        point = points[:, k]
+        while True:
+            a = chains[rows, np.maximum(sizes - 2, 0)]
+            b = chains[rows, np.maximum(sizes - 1, 0)]
+            turns = (b[:, 0] - a[:, 0]) * (point[:, 1] - a[:, 1]) - (b[:, 1] - a[:, 1]) * (point[:, 0] - a[:, 0])
+            pop = (sizes >= 2) & (turns <= 0)
+            if not pop.any():
+                break
+            sizes -= pop
+        chains[rows, sizes] = point
+        sizes += 1
+    return chains, sizes
+
+
+def convex_hulls(clouds):
+    """returns the convex hulls of many point clouds, ordered as convex_hull orders them, as a list of (H, 2)
+        arrays. clouds is an (M, N, 2) array or a list of (N, 2) arrays of any lengths, the work is done for every
+        cloud at once"""
+    if isinstance(clouds, np.ndarray):
+        points = clouds.astype(float)
+    else:
+        clouds = [np.asarray(cloud, dtype=float).reshape(-1, 2) for cloud in clouds]
+        points = np.empty((len(clouds), max(len(cloud) for cloud in clouds), 2))
+        for row, cloud in enumerate(clouds):
+            # Repeats of a point never add to a hull
+            points[row, :len(cloud)], points[row, len(cloud):] = cloud, cloud[-1]
+
+    order = np.lexsort((points[:, :, 1], points[:, :, 0]), axis=-1)
+    points = np.take_along_axis(points, order[:, :, None], axis=1)
+    lower, lower_sizes = half_hulls(points)
+    upper, upper_sizes = half_hulls(points[:, ::-1])
+
+    hulls = []
+    for row, (lower_size, upper_size) in enumerate(zip(lower_sizes.tolist(), upper_sizes.tolist())):
+        hull = np.concatenate((lower[row, :lower_size - 1], upper[row, :upper_size - 1]))
+        if len(hull) < 3:
+            raise ValueError(f"point cloud {row} has fewer than three points that aren't on one line")
+        start = np.lexsort((hull[:, 0], hull[:, 1]))[-1]
+        hulls.append(np.roll(hull, -start, axis=0))
+    return hulls
+
+
+class ShapeRegistry:
+    """Interns shapes by their geometry, so every body with the same shape shares one instance and the hull,
+        triangles, axes and mass properties are only worked out once. Shapes are dropped once no body uses them"""
+
+    def __init__(self):
+        self.polygons = WeakValueDictionary()     # vertex coordinates, as given and as the hull -> Polygon
+        self.circles = WeakValueDictionary()      # radius -> Circle
+
+    def __len__(self):
+        return len(set(self.polygons.values())) + len(self.circles)
+
+    @staticmethod
+    def get_key(vertices):
+        return tuple((vertex[0], vertex[1]) for vertex in vertices)
+
+    def get_polygon(self, vertices):
+        """returns the polygon of the convex hull of vertices, building it only the first time it is asked for"""
+        key = self.get_key(vertices)
+        polygon = self.polygons.get(key)
+        if polygon is None:
+            polygon = Polygon([Vector(vertex) for vertex in vertices])
+            # Inputs in a different order or with interior points share the shape of their hull
+            hull_key = self.get_key(polygon.vertices)
+            polygon = self.polygons.setdefault(hull_key, polygon)
+            self.polygons[key] = polygon
+        return polygon
+
+    def get_polygons(self, clouds):
+        """returns the polygon of each of many point clouds, their hulls all found at once by convex_hulls"""
+        polygons = []
+        for hull in convex_hulls(clouds):
+            hull = [tuple(point) for point in hull.tolist()]
+            key = self.get_key(hull)
+            polygon = self.polygons.get(key)
+            if polygon is None:
+                polygon = self.polygons[key] = Polygon([Vector(point) for point in hull], convex=True)
+            polygons.append(polygon)
+        return polygons
+
+    def get_circle(self, radius):
+        circle = self.circles.get(radius)
+        if circle is None:
+            circle = self.circles[radius] = Circle(radius)
+        return circle
+
+
+SHAPES = ShapeRegistry()
+
+
+_serials = count()     # numbers bodies in the order they are created
+
+
 class Collidable:
-    def __init__(self, shape, density, drawer):
+    position = BodyState('positions', vector=True, invalidates=True)
+    orientation = BodyState('orientations', invalidates=True)
+    linear_velocity = BodyState('linear_velocities', vector=True)
+    angular_velocity = BodyState('angular_velocities')
+    revision = BodyState('revisions')
+
+    def __init__(self, shape, density, drawer=None):
+        self.serial = next(_serials)    # fixed order between bodies, the same on every run unlike id()
         self.high_priority = False
-        self.drawer = drawer
+        self.drawer = drawer        # optional debug hook with a draw_vector(position, direction) method
         self.shape = shape
         self.density = density
 
         self.mass = shape.get_area() * self.density
-        self.inertia = self.mass * self.shape.get_bounding_radius()**2 / 2
+        self.inertia = self.shape.get_unit_inertia() * self.density
+
+        # Set by World.add, from then on the body's state lives in the world's arrays
+        self.world = None
+        self.index = None
+
+        # World-space geometry is cached against a revision that only changes when the body moves
+        self.revision = 0
+        self._cache_revision = -1
+        self._cache = {}
 
         self.position = Vector()
         self.orientation = 0
@@ -252,32 +499,80 @@ class Collidable:
         self.linear_velocity = Vector()
         self.angular_velocity = 0
 
+    def is_sleeping(self):
+        return self.world is not None and bool(self.world.sleeping[self.index])
+
+    def wake(self):
+        """wakes the body and everything it fell asleep touching, bodies outside a world never sleep"""
+        if self.world is not None:
+            self.world.wake(self)
+
+    def invalidate(self):
+        """marks cached geometry as stale, only needed after editing position components directly"""
+        self.revision += 1
+
+    def _cached(self, key, compute):
+        if self._cache_revision != self.revision:
+            self._cache.clear()
+            self._cache_revision = self.revision
+        value = self._cache.get(key)
+        if value is None:
+            value = self._cache[key] = compute()
+        return value
+
     def get_space(self):
-        return VectorSpace(self.position, self.orientation)
+        return self._cached('space', lambda: VectorSpace(self.position, self.orientation))
+
+    def get_world_vertices(self):
+        """returns the shape's vertices in world space, transformed at most once per move"""
+        return self._cached('vertices', lambda: self.shape.get_transformed_vertices([self.get_space()]))
+
+    def get_world_axes(self):
+        """returns the shape's edge normals rotated into world space"""
+        return self._cached('axes', lambda: [axis.rotate(self.orientation) for axis in self.shape.get_axis()])
+
+    def get_world_vertex_array(self):
+        return self._cached('vertex_array', lambda: VectorArray.from_vectors(self.get_world_vertices()).array)
+
+    def get_world_axis_array(self):
+        return self._cached('axis_array', lambda: VectorArray.from_vectors(self.get_world_axes()).array)
 
     def resolve_impulse(self, impulse, position, normal):
         """adjusts object's linear and angular velocity based on impulse and location of impulse relative to
             center of mass"""
+        self.wake()
         self.linear_velocity += (normal * impulse) / self.mass
         self.angular_velocity += position * impulse ^ normal / self.inertia
-        self.drawer.draw_vector(self.local_to_global(position), normal)
+        if self.drawer is not None:
+            self.drawer.draw_vector(self.local_to_global(position), normal)
 
     def get_bounding_rect(self):
+        return self._cached('rect', self._calc_bounding_rect)
+
+    def _calc_bounding_rect(self):
+        if isinstance(self.shape, Polygon):
+            return Polygon.bounding_rect_of(self.get_world_vertices())
         return self.shape.get_bounding_rect(self.get_space())
 
     def update_body(self):
-        self.position += self.linear_velocity
-        self.orientation += self.angular_velocity
+        # Bodies at rest keep their revision, and so their cached geometry
+        if self.linear_velocity.x or self.linear_velocity.y:
+            self.position += self.linear_velocity
+        if self.angular_velocity:
+            self.orientation += self.angular_velocity
 
         # Basic method of keeping objects from escaping screen
-        if self.position.x > SCREENWIDTH:
-            self.linear_velocity.x = -abs(self.linear_velocity.x)
-        elif self.position.x < 0:
-            self.linear_velocity.x = abs(self.linear_velocity.x)
-        elif self.position.y > SCREENHEIGHT:
-            self.linear_velocity.y = -abs(self.linear_velocity.y)
-        elif self.position.y < 0:
-            self.linear_velocity.y = abs(self.linear_velocity.y)
+        position = self.position
+        velocity = self.linear_velocity
+        if position.x > SCREENWIDTH:
+            velocity.x = -abs(velocity.x)
+        elif position.x < 0:
+            velocity.x = abs(velocity.x)
+        elif position.y > SCREENHEIGHT:
+            velocity.y = -abs(velocity.y)
+        elif position.y < 0:
+            velocity.y = abs(velocity.y)
+        self.linear_velocity = velocity
 
     def get_point_velocity(self, point):
         # self.drawer.draw_vector(Vector(point), self.linear_velocity + Vector(point).rotate(90+self.orientation))
@@ -289,6 +584,15 @@ class Collidable:
     def local_to_global(self, point):
         return point.transform([self.get_space()])
 
+    def contains_point(self, point):
+        """checks if the body covers a world space point"""
+        return self.shape.contains_point(self.global_to_local(Vector(point)))
+
+    def contains_points(self, points):
+        """returns which of an (N, 2) array of world space points the body covers"""
+        matrix = self.get_space().get_inverse_matrix()
+        return self.shape.contains_points(matrix.apply_array(np.asarray(points, dtype=float).reshape(-1, 2)).array)
+
     def get_linear_velocity(self):
         return self.linear_velocity
 
@@ -303,11 +607,17 @@ class Collidable:
 
     def project(self, axis):
         axis = axis.normalise()
-        minimum, maximum = self.shape.project(axis.rotate(-self.orientation))
-        projected_position = axis * self.position
-        minimum += projected_position
-        maximum += projected_position
-        return minimum, maximum
+        if isinstance(self.shape, Polygon):
+            projections = [axis * vertex for vertex in self.get_world_vertices()]
+            return min(projections), max(projections)
+
+        return tuple(self.shape.project(axis, self.get_space()))
+
+    def support(self, direction):
+        """returns the world space point of the shape's core furthest along direction"""
+        if isinstance(self.shape, Polygon):
+            return max(self.get_world_vertices(), key=lambda vertex: vertex * direction)
+        return self.local_to_global(self.shape.support(direction.rotate(-self.orientation)))
 
     def set_high_priority(self):
         self.high_priority = True
@@ -1,7 +1,8 @@
 import pygame
-from vector import Vector, VectorSpace
+from vector import Vector, VectorSpace, compose_spaces
 from math import sin, cos, pi
 from random import randint as ran
+from world import FixedTimestep
 
 
 class Hovercraft:
@@ -122,7 +123,10 @@ class Camera:
 
 def draw(craft, camera, screen):
     # Having actors draw themselves is not a good design
-    verts = [v.transform([craft.space, -camera.space, VectorSpace((400, 400))]).to_point() for v in craft.polygon]
+    # Each chain is composed into one matrix per frame rather than walked per point
+    craft_to_screen = compose_spaces([craft.space, -camera.space, VectorSpace((400, 400))])
+    world_to_screen = compose_spaces([-camera.space, VectorSpace((400, 400))])
+    verts = [craft_to_screen.apply(v).to_point() for v in craft.polygon]
     verts2 = [v.transform([VectorSpace((700, 100), craft.orientation)]).to_point() for v in craft.polygon]
     pygame.draw.polygon(screen, (255, 255, 255), verts, 2)
     pygame.draw.polygon(screen, (255, 255, 255), verts2, 2)
@@ -130,7 +134,7 @@ def draw(craft, camera, screen):
 
     for i in range(100):
         p = Vector((i * 100, i * 100))
-        p = p.transform([-camera.space, VectorSpace((400, 400))]).to_point()
+        p = world_to_screen.apply(p).to_point()
         pygame.draw.circle(screen, (255, 255, 255), p, 30)
 
 
@@ -148,6 +152,7 @@ def main():
     print(craft.thrusters)
 
     camera = Camera()
+    timestep = FixedTimestep()
 
     running = True
     n=0
@@ -155,13 +160,14 @@ def main():
         craft.setThrusters(pygame.key.get_pressed())
         if pygame.key.get_pressed()[pygame.K_w]:
             camera.start_shake()
-        craft.updateBodyEuler(1)
+        # updateBodyEuler works in ticks, one per fixed step
+        for _ in range(timestep.advance(clock.tick(60) / 1000)):
+            craft.updateBodyEuler(1)
         camera.track(craft.position)
         camera.shake(0.1)
         draw(craft, camera, screen)
         pygame.display.update()
         screen.fill(BGCOLOUR)
-        clock.tick(60)
         if n==15:
             pass
         n+=1
@@ -0,0 +1,173 @@
+import random
+import pytest
+from vector import Vector
+from shapes import Collidable, SHAPES
+from world import World
+from headless import make_shapes
+from collisions import AABBTree, SpatialHashGrid, SweepPrune, BROADPHASES, ray_rect_distance, rects_overlap, \
+    rects_touch
+from constants import COLLISION_TOLERANCE
+
+
+def make_circles(count, radius, spacing):
+    bodies = []
+    for i in range(count):
+        body = Collidable(SHAPES.get_circle(radius), 1)
+        body.position = Vector(50 + (i % 10) * spacing, 50 + (i // 10) * spacing)
+        bodies.append(body)
+    return bodies
+
+
+def test_grid_sizes_cells_for_bodies_added_after_it_was_built():
+    world = World(broadphase='grid')
+    grid = world.broadphase
+    assert grid.cell_size is None
+    world.tick()
+
+    bodies = make_circles(50, 10, 60)
+    for body in bodies:
+        world.add(body)
+    world.tick()
+    extent = max(rect[2] - rect[0] for rect in (body.get_bounding_rect() for body in bodies))
+    assert grid.cell_size >= extent
+    # A body no wider than a cell covers at most four of them
+    assert len(grid.keys) <= 4 * len(bodies)
+
+
+def test_grid_retunes_when_bodies_change_size():
+    world = World(make_circles(20, 5, 60), broadphase='grid')
+    world.tick()
+    small = world.broadphase.cell_size
+
+    for body in list(world.bodies):
+        world.remove(body)
+    for body in make_circles(20, 40, 100):
+        world.add(body)
+    world.tick()
+    assert world.broadphase.cell_size >= 4 * small
+
+
+def test_grid_keeps_a_given_cell_size():
+    grid = SpatialHashGrid([], cell_size=7)
+    for body in make_circles(10, 20, 60):
+        grid.add(body)
+    grid.get_pair_indices()
+    assert grid.cell_size == 7
+
+
+@pytest.mark.parametrize('broadphase', ['array_sweep', 'grid'])
+def test_array_broadphases_skip_pairs_of_sleeping_bodies(broadphase):
+    # Two touching pairs of resting circles, far enough apart to be separate islands
+    bodies = make_circles(2, 10, 15) + make_circles(2, 10, 15)
+    for body in bodies[2:]:
+        body.position += Vector(0, 400)
+    world = World(bodies, broadphase=broadphase)
+    for _ in range(60):
+        world.tick()
+    assert world.get_sleeping().all()
+    world.broadphase.update_values()
+    assert world.broadphase.get_broad_pairs() == []
+
+    bodies[0].wake()
+    bodies[0].position = bodies[1].position + Vector(5, 0)
+    world.broadphase.update_values()
+    pairs = world.broadphase.get_broad_pairs()
+    assert [set(pair) for pair in pairs] == [{bodies[0], bodies[1]}]
+
+
+@pytest.mark.parametrize('broadphase', sorted(BROADPHASES))
+def test_circles_within_tolerance_get_a_contact(broadphase):
+    bodies = make_circles(2, 10, 20 + COLLISION_TOLERANCE / 2)
+    world = World(bodies, broadphase=broadphase)
+    world.tick()
+    assert len(world.narrowphase.solver.manifolds) == 1
+
+
+def make_bodies(rand, count):
+    shapes = make_shapes(rand)
+    bodies = []
+    for i in range(count):
+        body = Collidable(shapes[i % len(shapes)], 1)
+        body.position = Vector(rand.uniform(0, 300), rand.uniform(0, 300))
+        body.orientation = rand.uniform(0, 6)
+        bodies.append(body)
+    return bodies
+
+
+def brute_force_pairs(bodies, overlap=rects_overlap):
+    rects = [body.get_bounding_rect() for body in bodies]
+    return {frozenset((bodies[i], bodies[j])) for i in range(len(bodies)) for j in range(i + 1, len(bodies))
+            if overlap(rects[i], rects[j])}
+
+
+def test_tree_ray_queries_match_brute_force():
+    rand = random.Random(5)
+    bodies = make_bodies(rand, 150)
+    tree = AABBTree(bodies)
+    for _ in range(100):
+        origin = (rand.uniform(-50, 350), rand.uniform(-50, 350))
+        direction = Vector(rand.uniform(-1, 1), rand.uniform(-1, 1)).normalise()
+        direction = rand.choice([direction, Vector(1, 0), Vector(0, -1)])
+        max_distance = rand.choice([float('inf'), 120])
+        expected = sorted((distance, body.serial) for distance, body in
+                          ((ray_rect_distance(body.get_bounding_rect(), origin, direction, max_distance), body)
+                           for body in bodies) if distance is not None)
+        hits = tree.query_ray(origin, direction, max_distance)
+        assert sorted((distance, body.serial) for distance, body in hits) == expected
+        assert [distance for distance, _ in hits] == sorted(distance for distance, _ in hits)
+
+
+def test_tree_pairs_follow_inserts_moves_and_removes():
+    rand = random.Random(6)
+    bodies = make_bodies(rand, 120)
+    tree = AABBTree(bodies[:80])
+    live = bodies[:80]
+    for step in range(20):
+        for body in rand.sample(live, 20):
+            body.position += Vector(rand.uniform(-15, 15), rand.uniform(-15, 15))
+        for body in rand.sample(live, 2):
+            tree.remove(body)
+            live.remove(body)
+        for body in bodies[80 + 2 * step:82 + 2 * step]:
+            tree.add(body)
+            live.append(body)
+        tree.update_values()
+        pairs = [frozenset(pair) for pair in tree.get_broad_pairs()]
+        assert len(pairs) == len(set(pairs))
+        assert set(pairs) == brute_force_pairs(live)
+
+
+@pytest.mark.parametrize('seed', range(4))
+def test_sweep_prune_adds_and_removes_match_a_rebuild(seed):
+    rand = random.Random(seed)
+    bodies = make_bodies(rand, 100)
+    # Circles on whole pixels share endpoint values, which add and remove have to place as a rebuild would
+    for i in range(0, 100, 4):
+        bodies[i] = Collidable(SHAPES.get_circle(rand.randint(3, 12)), 1)
+        bodies[i].position = Vector(rand.randint(0, 300), rand.randint(0, 300))
+    live = bodies[:50]
+    sweep = SweepPrune(live)
+    waiting = bodies[50:]
+    for _ in range(40):
+        action = rand.random()
+        if action < 0.4 and waiting:
+            body = waiting.pop()
+            sweep.add(body)
+            live.append(body)
+        elif action < 0.8 and live:
+            body = live.pop(rand.randrange(len(live)))
+            sweep.remove(body)
+            waiting.insert(0, body)
+        else:
+            for body in rand.sample(live, min(10, len(live))):
+                body.position += Vector(rand.uniform(-10, 10), rand.uniform(-10, 10))
+            sweep.update_values()
+
+        pairs = set(frozenset(pair) for pair in sweep.get_broad_pairs())
+        rebuilt = SweepPrune(live)
+        assert pairs == set(frozenset(pair) for pair in rebuilt.get_broad_pairs())
+        # Rects that only touch are paired or not depending on how their equal endpoints are ordered
+        assert brute_force_pairs(live) <= pairs <= brute_force_pairs(live, rects_touch)
+        assert sweep.overlapsX == rebuilt.overlapsX and sweep.overlapsY == rebuilt.overlapsY
+        region = [rand.uniform(0, 250), rand.uniform(0, 250), rand.uniform(250, 350), rand.uniform(250, 350)]
+        assert set(sweep.query_region(region)) == set(rebuilt.query_region(region))
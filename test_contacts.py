@@ -0,0 +1,28 @@
+import pytest
+from vector import Vector
+from shapes import Collidable, SHAPES
+from contacts import ContactSolver, collide_circles
+
+
+def make_circle(x, y, radius=10, velocity=(0, 0), high_priority=False):
+    body = Collidable(SHAPES.get_circle(radius), 1)
+    body.position = Vector(x, y)
+    body.linear_velocity = Vector(velocity)
+    body.high_priority = high_priority
+    return body
+
+
+@pytest.mark.parametrize('reverse', [False, True])
+def test_high_priority_bodies_stay_immovable_in_every_manifold(reverse):
+    # A wall touching both another wall and a ball coming at it, in either manifold order
+    wall = make_circle(0, 0, high_priority=True)
+    other_wall = make_circle(-19, 0, high_priority=True)
+    ball = make_circle(19, 0, velocity=(-5, 0))
+    manifolds = [collide_circles(other_wall, wall), collide_circles(wall, ball)]
+    if reverse:
+        manifolds.reverse()
+    ContactSolver().solve(manifolds)
+
+    assert tuple(wall.linear_velocity) == (0, 0)
+    assert tuple(other_wall.linear_velocity) == (0, 0)
+    assert ball.linear_velocity.x > 0
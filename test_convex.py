@@ -0,0 +1,116 @@
+import numpy as np
+import pytest
+from vector import Vector
+from shapes import Collidable, SHAPES
+from convex import convex_query, gjk
+
+
+def make_body(shape, x, y, orientation=0):
+    body = Collidable(shape, 1)
+    body.position = Vector(x, y)
+    body.orientation = orientation
+    return body
+
+
+def make_square(x, y, size=20, orientation=0):
+    return make_body(SHAPES.get_polygon([(0, 0), (size, 0), (size, size), (0, size)]), x, y, orientation)
+
+
+def point_segment_distance(point, a, b):
+    edge = b - a
+    t = min(max((point - a) * edge / (edge * edge), 0), 1)
+    return abs(point - (a + edge * t))
+
+
+def polygon_point_distance(body, point):
+    vertices = body.get_world_vertices()
+    return min(point_segment_distance(point, a, b) for a, b in zip(vertices, vertices[1:] + vertices[:1]))
+
+
+def polygon_distance(body1, body2):
+    """distance between two separated polygons, the closest pair is always a vertex of one and an edge of the
+        other"""
+    return min(min(polygon_point_distance(body2, vertex) for vertex in body1.get_world_vertices()),
+               min(polygon_point_distance(body1, vertex) for vertex in body2.get_world_vertices()))
+
+
+def sat_depth(body1, body2, offset=Vector(0, 0)):
+    """overlap of two polygons along the axis they overlap least on, negative when they are separated, with the
+        second one moved by offset"""
+    vertices1 = body1.get_world_vertices()
+    vertices2 = [vertex + offset for vertex in body2.get_world_vertices()]
+    depth = float('inf')
+    for axis in body1.get_world_axes() + body2.get_world_axes():
+        projections1 = [axis * vertex for vertex in vertices1]
+        projections2 = [axis * vertex for vertex in vertices2]
+        depth = min(depth, max(projections1) - min(projections2), max(projections2) - min(projections1))
+    return depth
+
+
+def random_polygons(seed, count):
+    rand = np.random.default_rng(seed)
+    shapes = SHAPES.get_polygons(rand.uniform(-20, 20, (count, 8, 2)))
+    return [make_body(shape, *rand.uniform(0, 80, 2).tolist(), rand.uniform(0, 6.3)) for shape in shapes]
+
+
+def test_random_polygons_match_brute_force_distance_and_sat_depth():
+    bodies = random_polygons(0, 200)
+    separated = overlapping = 0
+    for body1, body2 in zip(bodies[::2], bodies[1::2]):
+        result = convex_query(body1, body2)
+        depth = sat_depth(body1, body2)
+        if depth > 0:
+            overlapping += 1
+            assert result.distance == pytest.approx(-depth, abs=1e-6)
+            # Moving the second body along the normal by the depth leaves the two just touching
+            assert sat_depth(body1, body2, result.normal * depth) == pytest.approx(0, abs=1e-6)
+        else:
+            separated += 1
+            assert result.distance == pytest.approx(polygon_distance(body1, body2), abs=1e-6)
+    assert separated and overlapping
+
+
+@pytest.mark.parametrize('gap, expected', [(5, 5), (0, 0), (-3, -3)])
+def test_squares_side_by_side(gap, expected):
+    square1, square2 = make_square(0, 0), make_square(20 + gap, 5)
+    result = convex_query(square1, square2)
+    assert result.distance == pytest.approx(expected, abs=1e-9)
+    if expected:
+        assert (result.normal.x, result.normal.y) == pytest.approx((1, 0))
+
+
+@pytest.mark.parametrize('x', [50, 30, 25, 12])
+def test_circles(x):
+    circle1, circle2 = make_body(SHAPES.get_circle(10), 0, 0), make_body(SHAPES.get_circle(15), x, 0)
+    result = convex_query(circle1, circle2)
+    assert result.distance == pytest.approx(x - 25)
+    assert (result.normal.x, result.normal.y) == pytest.approx((1, 0))
+    assert (result.point1.x, result.point2.x) == pytest.approx((10, x - 15))
+
+
+@pytest.mark.parametrize('x, y', [(40, 10), (28, 10), (25, 10), (22, 10), (30, 30)])
+def test_circle_outside_a_polygon_core(x, y):
+    square = make_square(0, 0, orientation=0.2)
+    circle = make_body(SHAPES.get_circle(6), x, y)
+    result = convex_query(circle, square)
+    assert result.distance == pytest.approx(polygon_point_distance(square, circle.position) - 6, abs=1e-6)
+
+
+def test_coincident_circles_fall_back_to_a_fixed_normal():
+    circle1, circle2 = make_body(SHAPES.get_circle(10), 5, 5), make_body(SHAPES.get_circle(4), 5, 5)
+    simplex, closest = gjk(circle1, circle2)
+    assert len(simplex) < 3 and tuple(closest) == (0, 0)
+    result = convex_query(circle1, circle2)
+    assert result.distance == -14
+    assert tuple(result.normal) == (1, 0)
+
+
+def test_circle_centred_on_a_polygon_edge_falls_back_to_the_line_between_bodies():
+    square = make_square(0, 0)
+    circle = make_body(SHAPES.get_circle(5), 20, 10)
+    simplex, _ = gjk(circle, square)
+    assert len(simplex) < 3
+    result = convex_query(circle, square)
+    assert result.distance == pytest.approx(-5)
+    direction = (square.position - circle.position).normalise()
+    assert (result.normal.x, result.normal.y) == pytest.approx((direction.x, direction.y))
@@ -0,0 +1,60 @@
+import numpy as np
+import pytest
+from particles import ParticleSystem
+
+
+def brute_force_pairs(particles):
+    positions, radii = particles.get_positions(), particles.get_radii()
+    pairs = set()
+    for i in range(len(particles)):
+        for j in range(i + 1, len(particles)):
+            if np.sum((positions[i] - positions[j]) ** 2) < (radii[i] + radii[j]) ** 2:
+                pairs.add((i, j))
+    return pairs
+
+
+@pytest.mark.parametrize('cell_size', [None, 25])
+def test_find_pairs_matches_brute_force(cell_size):
+    rand = np.random.default_rng(0)
+    particles = ParticleSystem(capacity=16, cell_size=cell_size)
+    particles.extend(rand.uniform(-100, 200, (400, 2)), radii=rand.uniform(1, 8, 400))
+    particles.remove(7)
+    pairs = {tuple(sorted(pair)) for pair in particles.find_pairs().tolist()}
+    assert len(pairs) == len(particles.find_pairs())
+    assert pairs == brute_force_pairs(particles)
+    assert pairs
+
+
+def momentum_and_energy(particles):
+    masses = 1 / particles.inverse_masses[:len(particles), None]
+    velocities = particles.get_velocities()
+    return (masses * velocities).sum(axis=0), (masses * velocities ** 2).sum() / 2
+
+
+def test_collision_conserves_momentum_and_energy():
+    particles = ParticleSystem()
+    particles.add((100, 100), (2, 0.5), radius=5)
+    particles.add((108, 103), (-1, 0), radius=3, mass=4)
+    momentum, energy = momentum_and_energy(particles)
+    particles.tick()
+
+    assert particles.get_velocities()[0, 0] < 2
+    new_momentum, new_energy = momentum_and_energy(particles)
+    assert new_momentum == pytest.approx(momentum)
+    assert new_energy == pytest.approx(energy)
+
+
+def test_separating_pair_keeps_its_velocities():
+    particles = ParticleSystem()
+    particles.extend([(100, 100), (106, 100)], [(-1, 0), (1, 0)], radii=5)
+    particles.collide()
+    assert particles.get_velocities().tolist() == [[-1, 0], [1, 0]]
+
+
+def test_walls_reflect():
+    particles = ParticleSystem(bounds=(0, 0, 100, 100))
+    positions = [(-1, 50), (101, 50), (50, -1), (50, 101), (1, 50), (50, 50)]
+    velocities = [(-2, 1), (2, 1), (1, -2), (1, 2), (3, 0), (-2, -2)]
+    particles.extend(positions, velocities, radii=2)
+    particles.reflect()
+    assert particles.get_velocities().tolist() == [[2, 1], [-2, 1], [1, 2], [1, -2], [3, 0], [-2, -2]]
@@ -0,0 +1,89 @@
+import numpy as np
+import pytest
+from vector import Vector
+from shapes import Collidable, Polygon, SHAPES, convex_hull, convex_hulls, cross
+
+
+def make_body(shape, x=0, y=0, orientation=0):
+    body = Collidable(shape, 1)
+    body.position = Vector(x, y)
+    body.orientation = orientation
+    return body
+
+
+def edge_points(body):
+    vertices = body.get_world_vertices()
+    midpoints = [(a + b) / 2 for a, b in zip(vertices, vertices[1:] + vertices[:1])]
+    return [tuple(point) for point in vertices + midpoints]
+
+
+@pytest.mark.parametrize('orientation', [0, 0.3, 2])
+def test_polygon_edges_count_as_inside(orientation):
+    body = make_body(SHAPES.get_polygon([(0, 0), (40, 0), (40, 20), (0, 20)]), 100, 50, orientation)
+    points = edge_points(body)
+    assert all(body.contains_point(point) for point in points)
+    assert body.contains_points(points).all()
+
+
+def test_circle_edge_counts_as_inside():
+    body = make_body(SHAPES.get_circle(10), 30, 30)
+    points = [(40, 30), (30, 20), (20, 30), (30, 40), (30 + 6, 30 + 8)]
+    assert all(body.contains_point(point) for point in points)
+    assert body.contains_points(points).all()
+    assert not body.contains_point((40.001, 30))
+
+
+@pytest.mark.parametrize('shape', [SHAPES.get_circle(15), SHAPES.get_polygon([(0, 0), (30, 5), (20, 25), (-5, 12)])])
+def test_contains_points_agrees_with_contains_point(shape):
+    body = make_body(shape, 50, 40, 0.8)
+    rand = np.random.default_rng(0)
+    points = np.concatenate((rand.uniform(20, 80, (500, 2)), edge_points(body) if hasattr(shape, 'vertices') else
+                             [(65, 40), (50, 25)]))
+    assert body.contains_points(points).tolist() == [body.contains_point(point) for point in points.tolist()]
+
+
+def check_hull(hull, points):
+    """the hull starts on its highest vertex, the rightmost of those level with it, turns strictly left at every
+        vertex and contains every point"""
+    hull = [tuple(point) for point in hull]
+    assert hull[0] == max(points, key=lambda point: (point[1], point[0]))
+    assert all(cross(hull[i - 2], hull[i - 1], hull[i]) > 0 for i in range(len(hull)))
+    assert all(cross(hull[i - 1], hull[i], point) >= 0 for point in points for i in range(len(hull)))
+    assert set(hull) <= set(points)
+
+
+def test_hull_of_random_points():
+    rand = np.random.default_rng(2)
+    for _ in range(50):
+        points = [tuple(point) for point in rand.integers(-20, 20, (30, 2)).tolist()]
+        check_hull(convex_hull(points), points)
+
+
+def test_hull_drops_duplicate_and_collinear_points():
+    points = [(0, 0), (10, 0), (20, 0), (20, 10), (20, 20), (10, 20), (0, 20), (0, 10), (5, 5), (0, 0), (20, 20)]
+    assert convex_hull(points) == [(20, 20), (0, 20), (0, 0), (20, 0)]
+    polygon = Polygon([Vector(point) for point in points])
+    assert [tuple(vertex) for vertex in polygon.vertices] == [(20, 20), (0, 20), (0, 0), (20, 0)]
+
+
+@pytest.mark.parametrize('points', [[(0, 0), (10, 10), (5, 5), (-3, -3)], [(1, 2), (1, 2), (1, 2)], [(4, 0), (9, 0)]])
+def test_points_on_one_line_have_no_polygon(points):
+    with pytest.raises(ValueError):
+        Polygon([Vector(point) for point in points])
+    with pytest.raises(ValueError):
+        convex_hulls([points])
+
+
+def test_convex_hulls_matches_convex_hull():
+    rand = np.random.default_rng(3)
+    clouds = rand.integers(-30, 30, (40, 12, 2)).astype(float)
+    # Collinear and repeated points in a few clouds
+    clouds[0, :6] = [(0, 0), (5, 0), (10, 0), (10, 0), (10, 10), (0, 10)]
+    clouds[1, 1:] = clouds[1, 0] + (1, 1)
+    clouds[1, 4] = (-40, 40)
+    for hull, cloud in zip(convex_hulls(clouds), clouds):
+        assert [tuple(point) for point in hull.tolist()] == convex_hull([tuple(point) for point in cloud.tolist()])
+
+    ragged = [cloud[:rand.integers(6, 13)] for cloud in clouds]
+    for hull, cloud in zip(convex_hulls(ragged), ragged):
+        assert [tuple(point) for point in hull.tolist()] == convex_hull([tuple(point) for point in cloud.tolist()])
@@ -0,0 +1,110 @@
+import numpy as np
+import pytest
+from vector import Vector, VectorArray, VectorSpace, compose_spaces
+
+
+def make_array():
+    return VectorArray([[0, 0], [10, 10], [3, -4]])
+
+
+@pytest.mark.parametrize('offset', [Vector(1, 5), (1, 5), [1, 5], np.array([1., 5.])])
+def test_single_vector_translates_every_row(offset):
+    expected = [[1, 5], [11, 15], [4, 1]]
+    assert (make_array() + offset).array.tolist() == expected
+    assert (offset + make_array()).array.tolist() == expected
+    assert (make_array() - offset).array.tolist() == [[-1, -5], [9, 5], [2, -9]]
+    assert (offset - make_array()).array.tolist() == [[1, 5], [-9, -5], [-2, 9]]
+
+
+def test_two_row_array_still_takes_a_single_vector():
+    va = VectorArray([[0, 0], [10, 10]])
+    assert (va + np.array([1., 5.])).array.tolist() == [[1, 5], [11, 15]]
+
+
+def test_vector_per_row():
+    va = make_array()
+    offsets = np.array([[1, 1], [2, 2], [3, 3]])
+    assert (va + offsets).array.tolist() == [[1, 1], [12, 12], [6, -1]]
+    assert (va + VectorArray(offsets)).array.tolist() == [[1, 1], [12, 12], [6, -1]]
+
+
+def test_scaling():
+    va = make_array()
+    assert (va * 2).array.tolist() == [[0, 0], [20, 20], [6, -8]]
+    assert (va / 2).array.tolist() == [[0, 0], [5, 5], [1.5, -2]]
+    assert (va * np.array([[1.], [2.], [3.]])).array.tolist() == [[0, 0], [20, 20], [9, -12]]
+    assert va.scale([1, 2, 3]).array.tolist() == [[0, 0], [20, 20], [9, -12]]
+
+
+@pytest.mark.parametrize('axis', [Vector(1, 0), (1, 0), np.array([1., 0.])])
+def test_products_with_a_single_vector(axis):
+    va = make_array()
+    assert va.dot(axis).tolist() == [0, 10, 3]
+    assert (va * axis).tolist() == [0, 10, 3]
+    assert va.wedge(axis).tolist() == [0, -10, 4]
+    assert (va ^ axis).tolist() == [0, -10, 4]
+    assert va.project(axis) == (0, 10)
+
+
+def test_products_per_row():
+    va = make_array()
+    other = VectorArray([[1, 0], [0, 1], [1, 1]])
+    assert va.dot(other).tolist() == [0, 10, -1]
+    assert va.wedge(other.array).tolist() == [0, 10, 7]
+
+
+@pytest.mark.parametrize('other', [2, 'ab', (1, 2, 3), np.array([1., 2., 3.]), None])
+def test_products_reject_non_vectors(other):
+    with pytest.raises(TypeError):
+        make_array().dot(other)
+    with pytest.raises(TypeError):
+        make_array().wedge(other)
+    with pytest.raises(TypeError):
+        make_array() ^ other
+
+
+@pytest.mark.parametrize('other', ['ab', (1, 2, 3), np.array([1., 2., 3.]), None])
+def test_unsupported_operands(other):
+    with pytest.raises(TypeError):
+        make_array() + other
+    with pytest.raises(TypeError):
+        make_array() * other
+
+
+def close(a, b):
+    return abs(a.x - b.x) < 1e-9 and abs(a.y - b.y) < 1e-9
+
+
+def test_space_matrix_follows_in_place_edits():
+    space = VectorSpace((10, 20), 0.5)
+    point = Vector(3, -4)
+    assert close(space.get_matrix().apply(point), point.rotate(0.5) + Vector(10, 20))
+
+    space.position += Vector(5, 5)
+    assert close(space.get_matrix().apply(point), point.rotate(0.5) + Vector(15, 25))
+    space.position.x = 0
+    assert close(space.get_matrix().apply(point), point.rotate(0.5) + Vector(0, 25))
+    space.rotate(1)
+    assert close(space.get_matrix().apply(point), point.rotate(1.5) + Vector(0, 25))
+    space.direction = 0
+    assert close(space.get_inverse_matrix().apply(Vector(0, 25)), Vector(0, 0))
+
+
+def test_inverse_round_trips():
+    matrix = VectorSpace((-7, 3), 2.1).get_matrix() @ VectorSpace((40, 1), -0.3).get_matrix()
+    for point in (Vector(0, 0), Vector(1, 2), Vector(-50, 12.5)):
+        assert close(matrix.inverse().apply(matrix.apply(point)), point)
+        assert close(matrix.apply(matrix.inverse().apply(point)), point)
+    identity = (matrix @ matrix.inverse()).as_array()
+    assert np.allclose(identity, [[1, 0, 0], [0, 1, 0]])
+
+
+def test_compose_spaces_matches_chained_transforms():
+    spaces = [VectorSpace((30, 40), 0.7), -VectorSpace((5, -5), 1.2), None, VectorSpace((400, 400))]
+    matrix = compose_spaces(spaces)
+    points = [Vector(3, 4), Vector(-10, 0.5), Vector(0, 0)]
+    for point in points:
+        assert close(matrix.apply(point), point.transform(spaces))
+        assert close(matrix.inverse().apply(point), point.transform_inverse(spaces))
+    array = VectorArray.from_vectors(points).transform(spaces)
+    assert all(close(a, point.transform(spaces)) for a, point in zip(array, points))
@@ -0,0 +1,115 @@
+import numpy as np
+import pytest
+from headless import make_world, run
+from collisions import BROADPHASES, gather_bounds
+from vector import Vector
+from shapes import Collidable, SHAPES
+from world import World
+
+
+@pytest.mark.parametrize('broadphase', sorted(BROADPHASES))
+def test_identical_worlds_stay_identical(broadphase):
+    worlds = [make_world(400, 1, broadphase) for _ in range(2)]
+    for world in worlds:
+        run(world, 30)
+    first, second = (world.get_positions() for world in worlds)
+    assert np.array_equal(first, second)
+    first, second = (world.orientations[:len(world.bodies)] for world in worlds)
+    assert np.array_equal(first, second)
+
+
+def test_resting_bodies_fall_asleep():
+    world = make_world(20, 2)
+    world.linear_velocities[:] = 0
+    world.angular_velocities[:] = 0
+    assert not world.get_sleeping().any()
+    run(world, 40)
+    assert world.get_sleeping().all()
+
+    world.bodies[0].linear_velocity = Vector(1, 0)
+    world.bodies[0].wake()
+    assert not world.get_sleeping()[0]
+
+
+def test_body_vectors_write_through_when_assigned():
+    body = Collidable(SHAPES.get_circle(5), 1)
+    world = World([body])
+    body.linear_velocity += Vector(1, 2)
+    body.position = Vector(30, 40)
+    assert world.linear_velocities[0].tolist() == [1, 2]
+    assert world.get_positions()[0].tolist() == [30, 40]
+
+    world.remove(body)
+    assert tuple(body.position) == (30, 40)
+    assert tuple(body.linear_velocity) == (1, 2)
+
+
+@pytest.mark.parametrize('broadphase', sorted(BROADPHASES))
+def test_teleported_sleeping_body_collides_at_its_new_position(broadphase):
+    bodies = [Collidable(SHAPES.get_circle(10), 1) for _ in range(2)]
+    bodies[0].position = Vector(100, 100)
+    bodies[1].position = Vector(400, 400)
+    world = World(bodies, broadphase=broadphase)
+    run(world, 40)
+    assert world.get_sleeping().all()
+
+    bodies[0].position = Vector(405, 400)
+    assert not bodies[0].is_sleeping()
+    world.tick()
+    assert [set(pair) for pair in world.narrowphase.solver.manifolds] == [set(bodies)]
+
+
+def test_parallel_narrowphase_matches_serial():
+    serial = make_world(150, 3)
+    with make_world(150, 3, processes=2) as parallel:
+        parallel.narrowphase.parallel.batch_size = 4
+        run(serial, 30)
+        run(parallel, 30)
+        assert parallel.narrowphase.parallel.pool is not None
+    assert parallel.narrowphase.parallel.pool is None and parallel.narrowphase.parallel.memory is None
+    assert np.array_equal(serial.get_positions(), parallel.get_positions())
+    assert np.array_equal(serial.linear_velocities, parallel.linear_velocities)
+    assert np.array_equal(serial.orientations, parallel.orientations)
+
+
+def brute_force_hits(world, points):
+    return [{body for body in world.bodies if body.contains_point(point)} for point in points]
+
+
+@pytest.mark.parametrize('broadphase', sorted(BROADPHASES))
+def test_point_queries_match_brute_force(broadphase):
+    world = make_world(60, 4, broadphase)
+    run(world, 5)
+    rand = np.random.default_rng(1)
+    points = rand.uniform((0, 0), world.bounds[2:], (300, 2)).tolist()
+    # Vertices sit on the edge of their body and count as inside it
+    points += [tuple(vertex) for body in world.bodies[:10] if hasattr(body.shape, 'vertices')
+               for vertex in body.get_world_vertices()]
+    for body in world.bodies[::3]:
+        world.remove(body)
+
+    expected = brute_force_hits(world, points)
+    assert [set(hits) for hits in world.query_points(points)] == expected
+    assert [set(world.query_point(point)) for point in points] == expected
+    assert any(expected[300:])
+
+
+def body_rects(bodies):
+    return np.array([body.get_bounding_rect() for body in bodies], dtype=float).reshape(-1, 4)
+
+
+def test_body_bounds_match_each_bodys_rect():
+    world = make_world(70, 5, 'array_sweep')
+    run(world, 10)
+    assert np.array_equal(world.get_body_bounds(), body_rects(world.bodies))
+
+    world.bodies[3].position += Vector(25, -10)
+    world.bodies[4].orientation += 1
+    assert np.array_equal(world.get_body_bounds(), body_rects(world.bodies))
+
+    removed = world.bodies[::5]
+    for body in removed:
+        world.remove(body)
+    world.add(removed[0])
+    assert np.array_equal(world.get_body_bounds(), body_rects(world.bodies))
+    assert np.array_equal(gather_bounds(world.bodies[::-2]), body_rects(world.bodies[::-2]))
@@ -0,0 +1,49 @@
+import numpy as np
+from vector import compose_spaces
+from constants import *
+
+# Position history drawn behind moving bodies. Points are copied into a preallocated ring buffer, so recording
+# never allocates or shifts, and a whole trail is drawn as one polyline.
+
+
+class Trail:
+    """The last length recorded positions of a body, keeping one in every decimation positions it is given"""
+
+    def __init__(self, length=None, decimation=None, colour=None):
+        self.length = TRAIL_LENGTH if length is None else length
+        self.decimation = TRAIL_DECIMATION if decimation is None else decimation
+        self.colour = TRAIL_COLOUR if colour is None else colour
+        self.points = np.zeros((self.length, 2))
+        self.head = 0       # slot the next point is written to
+        self.count = 0
+        self.skipped = 0    # positions given since the last one kept
+
+    def __len__(self):
+        return self.count
+
+    def record(self, x, y):
+        if self.skipped:
+            self.skipped = (self.skipped + 1) % self.decimation
+            return
+        self.skipped = 1 % self.decimation
+        self.points[self.head] = x, y
+        self.head = (self.head + 1) % self.length
+        self.count = min(self.count + 1, self.length)
+
+    def clear(self):
+        self.head = self.count = self.skipped = 0
+
+    def get_points(self):
+        """returns the recorded points oldest first as an (N, 2) array"""
+        if self.count < self.length:
+            return self.points[:self.count]
+        return np.concatenate((self.points[self.head:], self.points[:self.head]))
+
+    def draw(self, surface, spaces=(), width=1):
+        """draws the trail as one polyline, through spaces as Vector.transform would take a point"""
+        import pygame
+
+        if self.count < 2:
+            return
+        points = compose_spaces(spaces).apply_array(self.get_points()).array
+        pygame.draw.lines(surface, self.colour, False, points.tolist(), width)
@@ -1,46 +1,96 @@
 from math import sin, cos, sqrt, pi
+from numbers import Real
+import numpy as np
 
 
 class Vector:
     """2D vector with arithmetic functionality"""
 
-    def __init__(self, values=(0, 0)):
-        if hasattr(values, '__iter__') and len(values) == 2:  # Maybe also type check to prevent strings eg "aa"
+    __slots__ = ('x', 'y')
+
+    def __init__(self, values=(0, 0), y=None):
+        # Vector(x, y) is the fast path, Vector((x, y)) accepts any 2-item iterable
+        if y is not None:
+            self.x = values
+            self.y = y
+        else:
             self.x, self.y = values
 
     def __xor__(self, other):
         # Wedge product
         if isinstance(other, Vector):
-            return self.x * other.get_y() - self.y * other.get_x()
+            return self.x * other.y - self.y * other.x
+        return NotImplemented
 
     def __add__(self, other):
-        if isinstance(other, (int, float)):
-            return Vector((self.x + other, self.y + other))
-        elif isinstance(other, Vector):
-            return Vector((self.x + other.get_x(), self.y + other.get_y()))
+        if isinstance(other, Vector):
+            return Vector(self.x + other.x, self.y + other.y)
+        elif isinstance(other, (int, float)):
+            return Vector(self.x + other, self.y + other)
+        return NotImplemented
 
     def __sub__(self, other):
-        if isinstance(other, (int, float)):
-            return Vector((self.x - other, self.y - other))
-        elif isinstance(other, Vector):
-            return Vector((self.x - other.get_x(), self.y - other.get_y()))
+        if isinstance(other, Vector):
+            return Vector(self.x - other.x, self.y - other.y)
+        elif isinstance(other, (int, float)):
+            return Vector(self.x - other, self.y - other)
+        return NotImplemented
 
     def __mul__(self, other):
         if isinstance(other, (int, float)):
-            return Vector((self.x * other, self.y * other))
+            return Vector(self.x * other, self.y * other)
         elif isinstance(other, Vector):
             return self.x * other.x + self.y * other.y
+        return NotImplemented
 
     def __truediv__(self, other):
         if isinstance(other, (int, float)):
-            return Vector((self.x / other, self.y / other))
+            return Vector(self.x / other, self.y / other)
+        return NotImplemented
+
+    def __iadd__(self, other):
+        if isinstance(other, Vector):
+            self.x += other.x
+            self.y += other.y
+        elif isinstance(other, (int, float)):
+            self.x += other
+            self.y += other
+        else:
+            return NotImplemented
+        return self
+
+    def __isub__(self, other):
+        if isinstance(other, Vector):
+            self.x -= other.x
+            self.y -= other.y
+        elif isinstance(other, (int, float)):
+            self.x -= other
+            self.y -= other
+        else:
+            return NotImplemented
+        return self
+
+    def __imul__(self, other):
+        # Only scaling is done in place, Vector * Vector is still the dot product
+        if isinstance(other, (int, float)):
+            self.x *= other
+            self.y *= other
+            return self
+        return NotImplemented
+
+    def __itruediv__(self, other):
+        if isinstance(other, (int, float)):
+            self.x /= other
+            self.y /= other
+            return self
+        return NotImplemented
 
     def __pow__(self, other):
         if other == 2:
             return self.x * self.y
 
     def __abs__(self):
-        return self.mag()
+        return sqrt(self.x * self.x + self.y * self.y)
 
     def __repr__(self):
         return str((self.x, self.y))
@@ -50,7 +100,7 @@ class Vector:
         yield self.y
 
     def __getitem__(self, item):
-        return [self.x, self.y][item]
+        return (self.x, self.y)[item]
 
     def __len__(self):
         return 2
@@ -65,51 +115,52 @@ class Vector:
         return self.y > other.y
 
     def __neg__(self):
-        return Vector((-self.x, -self.y))
+        return Vector(-self.x, -self.y)
+
+    def set(self, x, y):
+        self.x = x
+        self.y = y
+        return self
 
     def to_point(self):
         return int(self.x), int(self.y)
 
     def rotate90(self):
-        return Vector((-self.y, self.x))
+        return Vector(-self.y, self.x)
 
     def rotate(self, theta):
         # theta *= pi / 180
-        x = self.x * cos(theta) - self.y * sin(theta)
-        y = self.x * sin(theta) + self.y * cos(theta)
-        return Vector((x, y))
+        c, s = cos(theta), sin(theta)
+        return Vector(self.x * c - self.y * s, self.x * s + self.y * c)
 
     def rotate_ip(self, theta):
         # theta *= pi / 180
-        tmp = self.x * cos(theta) - self.y * sin(theta)
-        self.y = self.x * sin(theta) + self.y * cos(theta)
-        self.x = tmp
+        c, s = cos(theta), sin(theta)
+        self.x, self.y = self.x * c - self.y * s, self.x * s + self.y * c
 
     def transform(self, spaces):
-        new = Vector((self.x, self.y))
+        new = self
         for space in spaces:
             if isinstance(space, VectorSpace):
-                new.rotate_ip(space.direction)
-                new += space.position
-        return new
+                new = space.get_matrix().apply(new)
+        return new if new is not self else self.copy()
 
     def transform_inverse(self, spaces):
-        new = Vector((self.x, self.y))
+        new = self
         for space in spaces[::-1]:
             if isinstance(space, VectorSpace):
-                new -= space.position
-                new.rotate_ip(-space.direction)
-        return new
+                new = space.get_inverse_matrix().apply(new)
+        return new if new is not self else self.copy()
 
     def normalise(self):
-        new = Vector((self.x, self.y))
-        return new / abs(new)
+        mag = sqrt(self.x * self.x + self.y * self.y)
+        return Vector(self.x / mag, self.y / mag)
 
     def mag(self):
-        return sqrt(self.x ** 2 + self.y ** 2)
+        return sqrt(self.x * self.x + self.y * self.y)
 
     def hat(self):
-        return self / self.mag()
+        return self.normalise()
 
     def get_x(self):
         return self.x
@@ -121,7 +172,55 @@ class Vector:
         return int(self.x), int(self.y)
 
     def copy(self):
-        return Vector((self.x, self.y))
+        return Vector(self.x, self.y)
+
+
+class AffineMatrix:
+    """2x3 affine matrix [[a, b, tx], [c, d, ty]] mapping (x, y) to (a*x + b*y + tx, c*x + d*y + ty)"""
+
+    __slots__ = ('a', 'b', 'c', 'd', 'tx', 'ty')
+
+    def __init__(self, a=1, b=0, c=0, d=1, tx=0, ty=0):
+        self.a, self.b, self.c, self.d, self.tx, self.ty = a, b, c, d, tx, ty
+
+    @classmethod
+    def from_space(cls, position, direction):
+        """rotation by direction followed by translation by position, as Vector.transform does"""
+        c, s = cos(direction), sin(direction)
+        return cls(c, -s, s, c, position.x, position.y)
+
+    def __matmul__(self, other):
+        # self @ other applies other first, then self
+        return AffineMatrix(self.a * other.a + self.b * other.c,
+                            self.a * other.b + self.b * other.d,
+                            self.c * other.a + self.d * other.c,
+                            self.c * other.b + self.d * other.d,
+                            self.a * other.tx + self.b * other.ty + self.tx,
+                            self.c * other.tx + self.d * other.ty + self.ty)
+
+    def __repr__(self):
+        return f"AffineMatrix({self.a}, {self.b}, {self.c}, {self.d}, {self.tx}, {self.ty})"
+
+    def inverse(self):
+        det = self.a * self.d - self.b * self.c
+        a, b, c, d = self.d / det, -self.b / det, -self.c / det, self.a / det
+        return AffineMatrix(a, b, c, d, -(a * self.tx + b * self.ty), -(c * self.tx + d * self.ty))
+
+    def apply(self, vector):
+        x, y = vector.x, vector.y
+        return Vector(self.a * x + self.b * y + self.tx, self.c * x + self.d * y + self.ty)
+
+    def apply_array(self, points):
+        """transforms a whole VectorArray (or (N, 2) array) in one operation, returning a VectorArray"""
+        if isinstance(points, VectorArray):
+            points = points.array
+        return VectorArray(points @ self.linear().T + (self.tx, self.ty))
+
+    def linear(self):
+        return np.array(((self.a, self.b), (self.c, self.d)))
+
+    def as_array(self):
+        return np.array(((self.a, self.b, self.tx), (self.c, self.d, self.ty)))
 
 
 class VectorSpace:
@@ -134,6 +233,12 @@ class VectorSpace:
         self.position = Vector(position)
         self.direction = direction
 
+        # Matrices are cached against the values they were built from, so they survive until the space moves,
+        # including when position is changed in place
+        self._key = None
+        self._matrix = None
+        self._inverse = None
+
     def rotate(self, theta):
         self.direction += theta
 
@@ -142,3 +247,223 @@ class VectorSpace:
 
     def __neg__(self):
         return VectorSpace(-self.position, -self.direction)
+
+    def _update_cache(self):
+        key = (self.position.x, self.position.y, self.direction)
+        if key != self._key:
+            self._key = key
+            self._matrix = AffineMatrix.from_space(self.position, self.direction)
+            self._inverse = self._matrix.inverse()
+
+    def get_matrix(self):
+        """returns the cached affine matrix taking local coordinates to parent coordinates"""
+        self._update_cache()
+        return self._matrix
+
+    def get_inverse_matrix(self):
+        """returns the cached affine matrix taking parent coordinates to local coordinates"""
+        self._update_cache()
+        return self._inverse
+
+
+def compose_spaces(spaces):
+    """composes a chain of spaces into one matrix, equivalent to Vector.transform(spaces) and applied the same way"""
+    matrix = AffineMatrix()
+    for space in spaces:
+        if isinstance(space, VectorSpace):
+            matrix = space.get_matrix() @ matrix
+    return matrix
+
+
+class VectorArray:
+    """Batch of 2D vectors stored as one contiguous (N, 2) float array, with whole-array arithmetic"""
+
+    def __init__(self, values=()):
+        self.array = np.ascontiguousarray(values, dtype=float).reshape(-1, 2)
+
+    @classmethod
+    def from_vectors(cls, vectors):
+        return cls([(v.x, v.y) for v in vectors])
+
+    # Keeps numpy from broadcasting over a VectorArray as an object, so array + VectorArray comes here instead
+    __array_ufunc__ = None
+
+    @staticmethod
+    def _operand(other):
+        """returns something numpy can broadcast against an (N, 2) array, or None if unsupported. A Vector, 2-tuple
+            or (2,) array is one vector for every row, an (N, 2) array is one vector per row, and a number or an
+            (N, 1) array is a scale"""
+        if isinstance(other, VectorArray):
+            return other.array
+        if isinstance(other, Vector):
+            return np.array((other.x, other.y))
+        if isinstance(other, Real):
+            return other
+        if isinstance(other, (tuple, list, np.ndarray)):
+            try:
+                array = np.asarray(other, dtype=float)
+            except (TypeError, ValueError):
+                return None
+            if array.ndim == 0 or array.shape == (2,) or (array.ndim == 2 and array.shape[1] in (1, 2)):
+                return array
+        return None
+
+    @staticmethod
+    def _is_vectors(operand):
+        return isinstance(operand, np.ndarray) and operand.ndim > 0 and operand.shape[-1] == 2
+
+    def _vectors(self, other):
+        """returns other as one vector or one per row, for products"""
+        operand = self._operand(other)
+        if not self._is_vectors(operand):
+            raise TypeError(f"expected a vector or an (N, 2) array of vectors, not {type(other).__name__}")
+        return operand
+
+    def __add__(self, other):
+        other = self._operand(other)
+        if other is None:
+            return NotImplemented
+        return VectorArray(self.array + other)
+
+    __radd__ = __add__
+
+    def __sub__(self, other):
+        other = self._operand(other)
+        if other is None:
+            return NotImplemented
+        return VectorArray(self.array - other)
+
+    def __rsub__(self, other):
+        other = self._operand(other)
+        if other is None:
+            return NotImplemented
+        return VectorArray(other - self.array)
+
+    def __iadd__(self, other):
+        other = self._operand(other)
+        if other is None:
+            return NotImplemented
+        self.array += other
+        return self
+
+    def __isub__(self, other):
+        other = self._operand(other)
+        if other is None:
+            return NotImplemented
+        self.array -= other
+        return self
+
+    def __mul__(self, other):
+        # Scaling by a number (or an (N, 1) array of them), dot product with a vector or a vector per row
+        operand = self._operand(other)
+        if operand is None:
+            return NotImplemented
+        if self._is_vectors(operand):
+            return self.dot(operand)
+        return VectorArray(self.array * operand)
+
+    __rmul__ = __mul__
+
+    def __truediv__(self, other):
+        operand = self._operand(other)
+        if operand is None or self._is_vectors(operand):
+            return NotImplemented
+        return VectorArray(self.array / operand)
+
+    def __xor__(self, other):
+        # Wedge product, one value per row
+        if not self._is_vectors(self._operand(other)):
+            return NotImplemented
+        return self.wedge(other)
+
+    def __rxor__(self, other):
+        if not self._is_vectors(self._operand(other)):
+            return NotImplemented
+        return -self.wedge(other)
+
+    def __neg__(self):
+        return VectorArray(-self.array)
+
+    def __abs__(self):
+        return self.mag()
+
+    def __len__(self):
+        return len(self.array)
+
+    def __iter__(self):
+        for x, y in self.array.tolist():
+            yield Vector(x, y)
+
+    def __getitem__(self, item):
+        if isinstance(item, (int, np.integer)):
+            return Vector(*self.array[item].tolist())
+        return VectorArray(self.array[item])
+
+    def __repr__(self):
+        return f"VectorArray({self.array.tolist()})"
+
+    @property
+    def x(self):
+        return self.array[:, 0]
+
+    @property
+    def y(self):
+        return self.array[:, 1]
+
+    def dot(self, other):
+        other = self._vectors(other)
+        return self.array[:, 0] * other[..., 0] + self.array[:, 1] * other[..., 1]
+
+    def wedge(self, other):
+        other = self._vectors(other)
+        return self.array[:, 0] * other[..., 1] - self.array[:, 1] * other[..., 0]
+
+    def mag(self):
+        return np.hypot(self.array[:, 0], self.array[:, 1])
+
+    def scale(self, factors):
+        """returns the batch with each vector multiplied by its own factor"""
+        return VectorArray(self.array * np.asarray(factors, dtype=float).reshape(-1, 1))
+
+    def normalise(self):
+        return VectorArray(self.array / self.mag()[:, None])
+
+    def rotate90(self):
+        return VectorArray(np.column_stack((-self.array[:, 1], self.array[:, 0])))
+
+    def rotate(self, theta):
+        new = self.copy()
+        new.rotate_ip(theta)
+        return new
+
+    def rotate_ip(self, theta):
+        c, s = cos(theta), sin(theta)
+        x = self.array[:, 0].copy()
+        self.array[:, 0] = x * c - self.array[:, 1] * s
+        self.array[:, 1] = x * s + self.array[:, 1] * c
+
+    def transform(self, spaces):
+        return compose_spaces(spaces).apply_array(self)
+
+    def transform_inverse(self, spaces):
+        return compose_spaces(spaces).inverse().apply_array(self)
+
+    def project(self, axis):
+        """returns the lower and upper bounds of the shadow cast on a particular axis"""
+        projections = self.dot(axis)
+        return projections.min(), projections.max()
+
+    def get_bounds(self):
+        """returns [min_x, min_y, max_x, max_y] of all vectors in the batch"""
+        minimum = self.array.min(axis=0)
+        maximum = self.array.max(axis=0)
+        return [minimum[0], minimum[1], maximum[0], maximum[1]]
+
+    def get_int(self):
+        return self.array.astype(int)
+
+    def to_vectors(self):
+        return [Vector(x, y) for x, y in self.array.tolist()]
+
+    def copy(self):
+        return VectorArray(self.array.copy())
@@ -0,0 +1,316 @@
+import numpy as np
+from shapes import Collidable, Polygon
+from collisions import make_broadphase, CollisionHandler, gather_bounds, expand_ranges
+from constants import *
+
+
+class FixedTimestep:
+    """Turns variable frame times into a whole number of fixed steps, carrying the remainder over to the next frame"""
+
+    def __init__(self, timestep=None, max_substeps=None):
+        self.timestep = FIXED_TIMESTEP if timestep is None else timestep
+        self.max_substeps = MAX_SUBSTEPS if max_substeps is None else max_substeps
+        self.accumulator = 0
+
+    def advance(self, dt):
+        """returns how many fixed steps to run for dt seconds of frame time"""
+        self.accumulator += dt
+        steps = int(self.accumulator // self.timestep)
+        self.accumulator -= steps * self.timestep
+        if steps > self.max_substeps:
+            # Drop the backlog rather than fall further behind every frame (the spiral of death), the skipped steps
+            # have already left the accumulator
+            steps = self.max_substeps
+        return steps
+
+    def get_alpha(self):
+        """returns how far the current frame is between the last step and the next one, from 0 to 1"""
+        return self.accumulator / self.timestep
+
+
+class World:
+    """Holds the dynamic state of every body as NumPy arrays so integration runs over all bodies at once, the
+        Collidables added to it become views into these arrays"""
+
+    ARRAYS = ('positions', 'orientations', 'linear_velocities', 'angular_velocities', 'inverse_masses',
+              'inverse_inertias', 'revisions', 'previous_positions', 'previous_orientations', 'sleeping',
+              'sleep_times', 'islands')
+
+    def __init__(self, collidables=(), broadphase=None, bounds=None, capacity=64, timestep=None, max_substeps=None,
+                 processes=None):
+        self.bodies = []
+        self.bounds = (0, 0, SCREENWIDTH, SCREENHEIGHT) if bounds is None else bounds
+        self.clock = FixedTimestep(timestep, max_substeps)
+
+        self.positions = np.zeros((capacity, 2))
+        self.orientations = np.zeros(capacity)
+        self.linear_velocities = np.zeros((capacity, 2))
+        self.angular_velocities = np.zeros(capacity)
+        self.inverse_masses = np.zeros(capacity)
+        self.inverse_inertias = np.zeros(capacity)
+        self.revisions = np.zeros(capacity, dtype=np.int64)
+        # Pose before the last fixed step, rendering interpolates from here towards the current pose
+        self.previous_positions = np.zeros((capacity, 2))
+        self.previous_orientations = np.zeros(capacity)
+        # Sleeping bodies are skipped by integration and the narrowphase until something wakes their island
+        self.sleeping = np.zeros(capacity, dtype=bool)
+        self.sleep_times = np.zeros(capacity)       # seconds each body has been slow enough to sleep
+        self.islands = np.zeros(capacity, dtype=np.int64)   # the island each body fell asleep with
+        self.island_count = 0
+        # Every body's shape laid out as arrays, and the bounding rects last worked out from it, see get_body_bounds
+        self.layout = None
+        self.body_bounds = None
+        self.bounds_revisions = None
+
+        self.broadphase = None
+        for body in collidables:
+            self.add(body)
+        self.broadphase = make_broadphase(self.bodies, broadphase)
+        self.narrowphase = CollisionHandler(processes=processes)
+
+    def __len__(self):
+        return len(self.bodies)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """frees the narrowphase's worker processes and shared memory, the world can still be stepped afterwards"""
+        self.narrowphase.close()
+
+    def grow(self):
+        for name in self.ARRAYS:
+            array = getattr(self, name)
+            grown = np.zeros((2 * len(array),) + array.shape[1:], dtype=array.dtype)
+            grown[:len(array)] = array
+            setattr(self, name, grown)
+
+    def add(self, body: Collidable):
+        """moves a body's state into the world's arrays"""
+        if len(self.bodies) == len(self.positions):
+            self.grow()
+
+        state = (body.position, body.orientation, body.linear_velocity, body.angular_velocity, body.revision)
+        body.world, body.index = self, len(self.bodies)
+        self.bodies.append(body)
+        self.inverse_masses[body.index] = 1 / body.mass
+        self.inverse_inertias[body.index] = 1 / body.inertia
+        self.sleeping[body.index] = False
+        self.sleep_times[body.index] = 0
+        body.position, body.orientation, body.linear_velocity, body.angular_velocity, body.revision = state
+        self.previous_positions[body.index] = self.positions[body.index]
+        self.previous_orientations[body.index] = self.orientations[body.index]
+        self.layout = self.body_bounds = None
+
+        if self.broadphase is not None:
+            self.broadphase.add(body)
+
+    def remove(self, body: Collidable):
+        """hands a body its state back and fills its slot with the last body"""
+        if self.broadphase is not None:
+            self.broadphase.remove(body)
+
+        state = (body.position, body.orientation, body.linear_velocity, body.angular_velocity, body.revision)
+        index = body.index
+        last = self.bodies.pop()
+        if last is not body:
+            self.bodies[index] = last
+            last.index = index
+            for name in self.ARRAYS:
+                array = getattr(self, name)
+                array[index] = array[len(self.bodies)]
+
+        body.world = body.index = None
+        self.layout = self.body_bounds = None
+        body.position, body.orientation, body.linear_velocity, body.angular_velocity, body.revision = state
+
+    def integrate(self, dt=1):
+        """advances every body by its velocity and reflects those that have left the bounds back inside, dt is in
+            ticks since velocities are measured per tick"""
+        n = len(self.bodies)
+        positions = self.positions[:n]
+        velocities = self.linear_velocities[:n]
+        angular_velocities = self.angular_velocities[:n]
+
+        # Only moving bodies get a new revision, resting ones keep their cached geometry
+        moving = (velocities.any(axis=1) | (angular_velocities != 0)) & ~self.sleeping[:n]
+        positions += velocities * (dt * moving)[:, None]
+        self.orientations[:n] += angular_velocities * (dt * moving)
+        self.revisions[:n] += moving
+
+        min_x, min_y, max_x, max_y = self.bounds
+        speeds = np.abs(velocities)
+        velocities[:, 0] = np.where(positions[:, 0] > max_x, -speeds[:, 0],
+                                    np.where(positions[:, 0] < min_x, speeds[:, 0], velocities[:, 0]))
+        velocities[:, 1] = np.where(positions[:, 1] > max_y, -speeds[:, 1],
+                                    np.where(positions[:, 1] < min_y, speeds[:, 1], velocities[:, 1]))
+
+    def tick(self):
+        """runs one fixed step of the simulation"""
+        n = len(self.bodies)
+        self.previous_positions[:n] = self.positions[:n]
+        self.previous_orientations[:n] = self.orientations[:n]
+        self.integrate(self.clock.timestep * TICKS_PER_SECOND)
+        self.broadphase.update_values()
+        self.narrowphase.notify(self.broadphase.get_broad_pairs())
+        self.update_sleep(self.narrowphase.solver.manifolds.values())
+
+    def find_islands(self, manifolds):
+        """returns the island of every body, the index of one of its members, from the graph of touching bodies.
+            High priority bodies don't join islands, otherwise everything resting on the floor would be one island"""
+        parent = {}
+
+        def find(i):
+            root = i
+            while parent.get(root, root) != root:
+                root = parent[root]
+            while i != root:
+                parent[i], i = root, parent[i]
+            return root
+
+        for manifold in manifolds:
+            body1, body2 = manifold.body1, manifold.body2
+            if not (body1.is_high_priority() or body2.is_high_priority()):
+                parent[find(body1.index)] = find(body2.index)
+
+        islands = np.arange(len(self.bodies))
+        for i in list(parent):
+            islands[i] = find(i)
+        return islands
+
+    def update_sleep(self, manifolds):
+        """puts to sleep every island whose bodies have all been below the sleep velocities for TIME_TO_SLEEP"""
+        n = len(self.bodies)
+        velocities = self.linear_velocities[:n]
+        awake = ~self.sleeping[:n]
+        slow = (np.einsum('kd,kd->k', velocities, velocities) < SLEEP_LINEAR_VELOCITY ** 2) & \
+               (np.abs(self.angular_velocities[:n]) < SLEEP_ANGULAR_VELOCITY)
+        sleep_times = self.sleep_times[:n]
+        sleep_times[:] = np.where(slow & awake, sleep_times + self.clock.timestep, 0)
+
+        # An island is only as sleepy as its most restless body
+        islands = self.find_islands(manifolds)
+        island_times = np.full(n, np.inf)
+        np.minimum.at(island_times, islands, sleep_times)
+        falling = awake & (island_times[islands] >= TIME_TO_SLEEP)
+        if falling.any():
+            self.sleeping[:n] |= falling
+            self.islands[:n][falling] = islands[falling] + self.island_count
+            self.island_count += n
+            velocities[falling] = 0
+            self.angular_velocities[:n][falling] = 0
+
+    def wake(self, body):
+        """wakes a body along with the rest of the island it fell asleep with"""
+        index = body.index
+        if self.sleeping[index]:
+            n = len(self.bodies)
+            island = self.sleeping[:n] & (self.islands[:n] == self.islands[index])
+            self.sleeping[:n][island] = False
+            self.sleep_times[:n][island] = 0
+
+    def get_sleeping(self):
+        return self.sleeping[:len(self.bodies)]
+
+    def get_layout(self):
+        """returns the local vertices of every body's shape as an (N, order, 2) array, shorter polygons padded by
+            repeating their last vertex, along with each circle's radius (NaN for polygons)"""
+        if self.layout is None:
+            shapes = [body.shape for body in self.bodies]
+            order = max((shape.order for shape in shapes if isinstance(shape, Polygon)), default=1)
+            vertices = np.zeros((len(shapes), order, 2))
+            radii = np.full(len(shapes), np.nan)
+            for row, shape in enumerate(shapes):
+                if isinstance(shape, Polygon):
+                    local = [(vertex.x, vertex.y) for vertex in shape.vertices]
+                    vertices[row, :len(local)], vertices[row, len(local):] = local, local[-1]
+                else:
+                    radii[row] = shape.radius
+            self.layout = vertices, radii
+        return self.layout
+
+    def get_body_bounds(self):
+        """returns the bounding rect of every body as an (N, 4) array, the same rects get_bounding_rect gives but
+            worked out for every body at once from the pose arrays. They are kept until a body moves"""
+        n = len(self.bodies)
+        revisions = self.revisions[:n]
+        if self.body_bounds is not None and np.array_equal(self.bounds_revisions, revisions):
+            return self.body_bounds
+
+        vertices, radii = self.get_layout()
+        positions = self.positions[:n]
+        c, s = np.cos(self.orientations[:n])[:, None], np.sin(self.orientations[:n])[:, None]
+        # Applied term by term as AffineMatrix.apply does, so the rects match the bodies' own to the bit
+        x = c * vertices[:, :, 0] + -s * vertices[:, :, 1] + positions[:, 0, None]
+        y = s * vertices[:, :, 0] + c * vertices[:, :, 1] + positions[:, 1, None]
+        bounds = np.column_stack((x.min(axis=1) - 3, y.min(axis=1) - 3, x.max(axis=1) + 4, y.max(axis=1) + 4))
+
+        circles = ~np.isnan(radii)
+        reach = (radii[circles] + COLLISION_TOLERANCE)[:, None]
+        bounds[circles] = np.concatenate((positions[circles] - reach, positions[circles] + reach), axis=1)
+        self.body_bounds, self.bounds_revisions = bounds, revisions.copy()
+        return bounds
+
+    def step(self, dt):
+        """advances the simulation by dt seconds of frame time in fixed steps, returning how many were run"""
+        steps = self.clock.advance(dt)
+        for _ in range(steps):
+            self.tick()
+        return steps
+
+    def query_point(self, point):
+        """returns every body covering a point, from the broadphase's candidates"""
+        x, y = point[0], point[1]
+        return [body for body in self.broadphase.query_region([x, y, x, y]) if body.contains_point((x, y))]
+
+    def query_points(self, points):
+        """returns the bodies covering each of an (N, 2) array of points, as a list of lists. The broadphase gives
+            the candidates around all of the points, which are swept against them along x, then each candidate
+            checks every point left in its rect at once"""
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        hits = [[] for _ in range(len(points))]
+        if not len(points):
+            return hits
+        (x1, y1), (x2, y2) = points.min(axis=0).tolist(), points.max(axis=0).tolist()
+        candidates = self.broadphase.query_region([x1, y1, x2, y2])
+        if not candidates:
+            return hits
+
+        # A rect containing a point starts at most the widest rect to its left
+        bounds = gather_bounds(candidates)
+        order = np.argsort(bounds[:, 0], kind='stable')
+        starts = bounds[order, 0]
+        widest = float((bounds[:, 2] - bounds[:, 0]).max())
+        begin = np.searchsorted(starts, points[:, 0] - widest, side='left')
+        end = np.searchsorted(starts, points[:, 0], side='right')
+        point_indices, slots = expand_ranges(begin, end - begin)
+        owners = order[slots]
+        x, y = points[point_indices, 0], points[point_indices, 1]
+        inside = (x <= bounds[owners, 2]) & (bounds[owners, 1] <= y) & (y <= bounds[owners, 3])
+        point_indices, owners = point_indices[inside], owners[inside]
+
+        grouping = np.argsort(owners, kind='stable')
+        point_indices, owners = point_indices[grouping], owners[grouping]
+        owners, firsts = np.unique(owners, return_index=True)
+        for owner, group in zip(owners.tolist(), np.split(point_indices, firsts[1:])):
+            body = candidates[owner]
+            for i in group[body.contains_points(points[group])].tolist():
+                hits[i].append(body)
+        return hits
+
+    def get_render_positions(self):
+        """returns positions interpolated between the last two fixed steps for the current frame"""
+        n = len(self.bodies)
+        alpha = self.clock.get_alpha()
+        return self.previous_positions[:n] + (self.positions[:n] - self.previous_positions[:n]) * alpha
+
+    def get_render_orientations(self):
+        n = len(self.bodies)
+        alpha = self.clock.get_alpha()
+        return self.previous_orientations[:n] + (self.orientations[:n] - self.previous_orientations[:n]) * alpha
+
+    def get_positions(self):
+        return self.positions[:len(self.bodies)]